@@ -0,0 +1,118 @@
+"""
+統計分析：讀取預先計算的 clinic_stat 統計表（由 stats.py 增量維護）
+查詢筆數只與縣市 / 科別 / 媒體項目的種類數有關，不掃描 clinic 表
+"""
+from collections import Counter
+from sqlalchemy import select
+
+# 儀表板以「媒體項目包含全部」視為健康醫購
+HEALTH_MALL_MEDIA = '全部'
+
+
+def load_stats(db, stat_table, kinds):
+    """讀取指定種類的統計，回傳 {kind: Counter}（依數量由多到少、名稱排序）"""
+    rows = db.session.execute(
+        select(stat_table.c.kind, stat_table.c.key, stat_table.c.value).where(
+            stat_table.c.kind.in_(kinds), stat_table.c.value > 0
+        ).order_by(stat_table.c.kind, stat_table.c.value.desc(), stat_table.c.key)
+    ).all()
+
+    stats = {kind: Counter() for kind in kinds}
+    for kind, key, value in rows:
+        stats[kind][key] = value
+    return stats
+
+
+def overall(stats):
+    """由統計結果取出總數、有媒體項目、健康醫購、百位數量"""
+    total = stats['total']['']
+    media_clinics = stats['media']['']
+    return {
+        'total': total,
+        'media_clinics': media_clinics,
+        'no_media_clinics': total - media_clinics,
+        'health_mall': stats['health_mall'][''],
+        'hundred_position': stats['hundred_position'][''],
+    }
+
+
+def regions_of(stats):
+    """由統計結果取出各縣市 (縣市, 診所數, 健康醫購數)，依數量由多到少排序"""
+    return [
+        (region, total, stats['region_health_mall'][region])
+        for region, total in stats['region'].items()
+    ]
+
+
+def totals(db, stat_table):
+    """總數、有媒體項目、健康醫購、百位數量"""
+    return overall(load_stats(db, stat_table, ['total', 'media', 'health_mall', 'hundred_position']))
+
+
+def region_breakdown(db, stat_table):
+    """各縣市診所數與健康醫購數，依數量由多到少排序"""
+    return regions_of(load_stats(db, stat_table, ['region', 'region_health_mall']))
+
+
+def specialty_breakdown(db, stat_table):
+    """各科別診所數與健康醫購數"""
+    stats = load_stats(db, stat_table, ['specialty', 'specialty_health_mall'])
+    return stats['specialty'], stats['specialty_health_mall']
+
+
+def media_breakdown(db, stat_table):
+    """各媒體項目的診所數"""
+    return load_stats(db, stat_table, ['media_item'])['media_item']
+
+
+def summary(db, stat_table):
+    """儀表板所需的全部統計（單次查詢）"""
+    stats = load_stats(db, stat_table, [
+        'total', 'media', 'health_mall', 'hundred_position', 'region', 'region_health_mall',
+        'specialty', 'specialty_health_mall', 'media_item',
+    ])
+    totals = overall(stats)
+    regions = regions_of(stats)
+
+    specialty_items = stats['specialty'].most_common()
+    health_mall_items = stats['specialty_health_mall'].most_common()
+    media_items = stats['media_item'].most_common()
+    region_names = sorted(r for r, _, _ in regions)
+    by_region = {r: (total, yes) for r, total, yes in regions}
+
+    return {
+        'stats': {
+            'total': totals['total'],
+            'media_clinics': totals['media_clinics'],
+            'no_media_clinics': totals['no_media_clinics'],
+        },
+        'regions': {
+            'regions': [r for r, _, _ in regions],
+            'counts': [total for _, total, _ in regions],
+        },
+        'specialties': {
+            'specialties': [name for name, _ in specialty_items],
+            'counts': [count for _, count in specialty_items],
+        },
+        'taiwan_map': [{'name': r, 'value': total} for r, total, _ in regions],
+        'health_mall': {
+            'total': totals['health_mall'],
+            'by_specialty': {
+                'specialties': [name for name, _ in health_mall_items],
+                'counts': [count for _, count in health_mall_items],
+            },
+            'by_region': {
+                'regions': region_names,
+                'yes': [by_region[r][1] for r in region_names],
+                'no': [by_region[r][0] - by_region[r][1] for r in region_names],
+            },
+        },
+        'hundred_position': {
+            '是': totals['hundred_position'],
+            '否': totals['total'] - totals['hundred_position'],
+        },
+        'media_items': {
+            'items': [name for name, _ in media_items],
+            'counts': [count for _, count in media_items],
+        },
+    }
@@ -0,0 +1,760 @@
+"""
+API 路由（blueprint：api）與讀取查詢
+- read_* 讀取查詢由 Flask 路由與 asgi.py 的非同步路由共用
+- export / import_data 依賴 openpyxl，第一次匯入 / 匯出時才載入，不拖慢冷啟動
+"""
+from flask import Blueprint, request, jsonify, session, send_file, Response, stream_with_context, current_app
+from datetime import datetime
+import os
+import uuid
+from urllib.parse import quote
+from werkzeug.utils import secure_filename
+import analytics as analytics_queries
+import bulk
+import cache
+import changelog
+import db_config
+import dedup
+import facets
+import geo
+import jobs
+import replica
+import search as search_index
+import tags
+from models import db, Clinic, ClinicChange, ClinicStat, DataVersion, GeocodeCache, Job
+from pagination import PaginationError, parse_limit, parse_offset, paginate, order_clauses, iter_keyset
+
+api = Blueprint('api', __name__)
+
+# 讀取 API 回應快取（以資料版本區分，版本遞增後舊項目自然淘汰）
+response_cache = cache.LRUCache(int(os.environ.get('RESPONSE_CACHE_SIZE', cache.CACHE_SIZE)))
+versioned = cache.versioned(db, DataVersion, response_cache)
+
+# 可由 API 寫入的欄位
+CLINIC_FIELDS = [
+    'region', 'district', 'name', 'health_mall', 'hundred_position', 'media_items',
+    'specialties', 'address', 'phone', 'contact_person', 'business_hours', 'note',
+    'latitude', 'longitude'
+]
+
+# API 回傳的欄位（依序）
+OUTPUT_FIELDS = ['id'] + CLINIC_FIELDS + ['created_at', 'updated_at']
+
+def format_field(field, value):
+    """單一欄位的輸出格式"""
+    if field in ('health_mall', 'hundred_position'):
+        return value or '否'
+    if field in ('created_at', 'updated_at'):
+        return value.strftime('%Y-%m-%d %H:%M:%S') if value else None
+    return value
+
+def clinic_to_dict(c, fields=OUTPUT_FIELDS):
+    """診所資料序列化（c 可為 Clinic 物件或只選取部分欄位的查詢結果列）"""
+    return {field: format_field(field, getattr(c, field)) for field in fields}
+
+def parse_fields(value):
+    """
+    解析 fields 參數（逗號分隔），回傳欄位清單；未指定時回傳 None（全部欄位）
+    id 一律包含（分頁 cursor 與前端操作需要）
+    """
+    if not value:
+        return None
+    fields = ['id']
+    for field in value.split(','):
+        field = field.strip()
+        if not field or field in fields:
+            continue
+        if field not in OUTPUT_FIELDS:
+            raise PaginationError(f'不支援的欄位: {field}')
+        fields.append(field)
+    return fields
+
+# 匯出時每批讀取的筆數
+EXPORT_BATCH_SIZE = 1000
+
+# 列表可排序欄位
+SORT_COLUMNS = {
+    'id': Clinic.id,
+    'name': Clinic.name,
+    'region': Clinic.region,
+    'district': Clinic.district,
+    'created_at': Clinic.created_at,
+    'updated_at': Clinic.updated_at,
+}
+
+# 健康檢查
+@api.route('/api/health')
+def health_check():
+    """資料庫連線與連線池狀態（部署平台健康檢查使用）"""
+    result = db_config.health(db)
+    read_engines = current_app.extensions['read_engines']
+    if read_engines:
+        result['replicas'] = replica.health(read_engines, DataVersion)
+    return jsonify(result), 200 if result['status'] == 'ok' else 503
+
+# 列表的篩選參數
+FILTER_PARAMS = ('search', 'region', 'specialty', 'media_item')
+
+def filter_clinics(args, session=None):
+    """
+    依篩選參數（search、region、specialty、media_item）建立查詢
+    回傳 (query, rank)，rank 為搜尋相關度排序運算式（沒有搜尋時為 None）
+    session 預設為 db.session（ASGI 模式傳入非同步引擎的 session）
+    """
+    session = session or db.session
+    search = args.get('search', '')
+    region = args.get('region', '')
+    specialty = args.get('specialty', '')
+    media_item = args.get('media_item', '')
+    
+    query = session.query(Clinic)
+    rank = None
+    
+    if search:
+        query, rank = search_index.apply_search(query, session, Clinic, search)
+    
+    if region:
+        query = query.filter(Clinic.region == region)
+    
+    if specialty:
+        query = query.filter(tags.tag_filter(Clinic, 'specialties', specialty))
+    
+    if media_item:
+        query = query.filter(tags.tag_filter(Clinic, 'media_items', media_item))
+    
+    return query, rank
+
+# 讀取 API 的查詢（WSGI 的 Flask 路由與 asgi.py 的非同步路由共用）
+# 皆接受 (db, args)，回傳 (JSON 內容, 額外標頭)；參數錯誤時拋出 PaginationError
+def read_clinics(db, args):
+    """診所列表（篩選、排序、分頁）"""
+    # 異動版本先於資料讀取，之後的異動一定會出現在 since 此版本的同步結果中
+    change_version = changelog.current_version(db.session, ClinicChange.__table__)
+    query, rank = filter_clinics(args, db.session)
+    
+    # 分頁與排序（未帶 limit 時維持一次回傳全部）
+    sort = args.get('sort', 'id')
+    order = args.get('order', 'asc')
+    cursor = args.get('cursor', '')
+    
+    if sort not in SORT_COLUMNS:
+        raise PaginationError(f'不支援的排序欄位: {sort}')
+    if order not in ('asc', 'desc'):
+        raise PaginationError('order 只能是 asc 或 desc')
+    
+    limit = parse_limit(args.get('limit'))
+    offset = parse_offset(args.get('offset'))
+    if offset is not None and cursor:
+        raise PaginationError('offset 與 cursor 不可同時使用')
+    if limit is None and (cursor or offset is not None):
+        raise PaginationError('使用 cursor / offset 時必須指定 limit')
+    fields = parse_fields(args.get('fields'))
+    shape = args.get('shape', 'rows')
+    if shape not in ('rows', 'columns'):
+        raise PaginationError('shape 只能是 rows 或 columns')
+    
+    if limit is not None:
+        total = query.order_by(None).count()
+    
+    if fields:
+        # 只在 SQL 選取需要的欄位（另含排序欄位供 cursor 使用），不建立完整的 Clinic 物件
+        columns = [getattr(Clinic, f) for f in fields]
+        if SORT_COLUMNS[sort].key not in fields:
+            columns.append(SORT_COLUMNS[sort])
+        query = query.with_entities(*columns)
+    
+    if limit is None or offset is not None:
+        if rank is not None and 'sort' not in args:
+            # 搜尋且未指定排序時，依相關度排序
+            query = query.order_by(rank, Clinic.id)
+        else:
+            query = query.order_by(*order_clauses(SORT_COLUMNS[sort], Clinic.id, order == 'desc'))
+        if offset is not None:
+            # 依位置取一頁（排序與不分頁時相同，各頁可接成完整列表）
+            query = query.offset(offset).limit(limit)
+        clinics = query.all()
+        if limit is None:
+            total = len(clinics)
+        next_cursor = None
+    else:
+        clinics, next_cursor = paginate(
+            query, SORT_COLUMNS[sort], Clinic.id, limit,
+            cursor=cursor, descending=(order == 'desc')
+        )
+    
+    headers = {'X-Total-Count': str(total), 'X-Change-Version': str(change_version)}
+    if next_cursor:
+        headers['X-Next-Cursor'] = next_cursor
+    fields = fields or OUTPUT_FIELDS
+    if shape == 'columns':
+        # 欄位導向：一份欄位名稱，每個欄位一個陣列
+        return {
+            'fields': fields,
+            'columns': [[format_field(f, getattr(c, f)) for c in clinics] for f in fields]
+        }, headers
+    return [clinic_to_dict(c, fields) for c in clinics], headers
+
+def read_stats(db, args):
+    """首頁統計"""
+    overall = analytics_queries.totals(db, ClinicStat.__table__)
+    
+    return {
+        'total': overall['total'],
+        'media_clinics': overall['media_clinics'],
+        'no_media_clinics': overall['no_media_clinics']
+    }, {}
+
+def read_analytics_summary(db, args):
+    """儀表板所需統計（單次請求）"""
+    return analytics_queries.summary(db, ClinicStat.__table__), {}
+
+def read_region_stats(db, args):
+    """各縣市診所數量統計"""
+    regions = analytics_queries.region_breakdown(db, ClinicStat.__table__)
+    
+    return {
+        'regions': [region for region, _, _ in regions],
+        'counts': [count for _, count, _ in regions]
+    }, {}
+
+def read_specialty_stats(db, args):
+    """科別統計（處理複選）"""
+    specialty_count, _ = analytics_queries.specialty_breakdown(db, ClinicStat.__table__)
+    
+    return {
+        'specialties': list(specialty_count.keys()),
+        'counts': list(specialty_count.values())
+    }, {}
+
+def read_taiwan_map(db, args):
+    """台灣地圖資料（縣市對應）"""
+    regions = analytics_queries.region_breakdown(db, ClinicStat.__table__)
+    
+    # ECharts 台灣地圖的縣市名稱對應
+    map_data = []
+    for region, count, _ in regions:
+        map_data.append({
+            'name': region,
+            'value': count
+        })
+    
+    return map_data, {}
+
+def parse_coordinate(args, name, low, high, default=None):
+    """解析座標 / 半徑參數"""
+    value = args.get(name)
+    if value in (None, ''):
+        if default is None:
+            raise PaginationError(f'缺少 {name} 參數')
+        return default
+    try:
+        value = float(value)
+    except ValueError:
+        raise PaginationError(f'{name} 必須是數字')
+    if not low <= value <= high:
+        raise PaginationError(f'{name} 必須介於 {low} 與 {high} 之間')
+    return value
+
+def read_nearby(db, args):
+    """附近診所（lat、lng、radius 公里，可搭配列表的篩選參數），由近到遠排序"""
+    latitude = parse_coordinate(args, 'lat', -90, 90)
+    longitude = parse_coordinate(args, 'lng', -180, 180)
+    radius = parse_coordinate(args, 'radius', 0, geo.MAX_RADIUS, geo.DEFAULT_RADIUS)
+    limit = parse_limit(args.get('limit')) or geo.DEFAULT_LIMIT
+    fields = parse_fields(args.get('fields')) or OUTPUT_FIELDS
+    
+    query, _ = filter_clinics(args, db.session)
+    results = geo.nearby(query, db.session, Clinic, latitude, longitude, radius)
+    
+    ids = [clinic_id for _, clinic_id in results[:limit]]
+    clinics = {c.id: c for c in db.session.query(Clinic).filter(Clinic.id.in_(ids))} if ids else {}
+    
+    payload = []
+    for distance, clinic_id in results[:limit]:
+        item = clinic_to_dict(clinics[clinic_id], fields)
+        item['distance_km'] = round(distance, 3)
+        payload.append(item)
+    return payload, {'X-Total-Count': str(len(results))}
+
+def read_changes(db, args):
+    """
+    增量同步：since 版本之後新增 / 修改（upserts，目前的完整資料）與刪除（deleted，id）的診所
+    has_more 為 true 時以回傳的 version 為 since 繼續取得
+    """
+    try:
+        since = int(args.get('since', 0))
+    except ValueError:
+        raise PaginationError('since 必須為整數')
+    if since < 0:
+        raise PaginationError('since 不可為負數')
+    limit = parse_limit(args.get('limit')) or changelog.DEFAULT_LIMIT
+    fields = parse_fields(args.get('fields')) or OUTPUT_FIELDS
+    
+    upserts, deleted, version, has_more = changelog.changes_since(db.session, ClinicChange.__table__, since, limit)
+    clinics = db.session.query(Clinic).filter(Clinic.id.in_(upserts)).order_by(Clinic.id).all() if upserts else []
+    # 之後才刪除的診所不在 upserts 中，會在下一次同步的 deleted 出現
+    return {
+        'version': version,
+        'has_more': has_more,
+        'upserts': [clinic_to_dict(c, fields) for c in clinics],
+        'deleted': deleted,
+    }, {'X-Change-Version': str(version)}
+
+def read_facets(db, args):
+    """
+    目前篩選條件下各縣市、區域、科別、媒體項目、健康醫購的筆數（facets 參數可只取部分分面）
+    縣市 / 科別 / 媒體項目不套用自身的條件，切換選項時可看到其他選項的筆數
+    """
+    names = facets.parse_facets(args.get('facets'))
+    
+    def filtered(exclude):
+        params = {key: args.get(key, '') for key in FILTER_PARAMS if key != exclude}
+        if not any(params.values()):
+            return None
+        query, _ = filter_clinics(params, db.session)
+        return query
+    
+    counts, total = facets.facet_counts(db.session, Clinic, names, filtered)
+    return {'total': total, 'facets': counts}, {'X-Total-Count': str(total)}
+
+# 路徑與查詢的對應
+READ_ENDPOINTS = {
+    '/api/clinics': read_clinics,
+    '/api/clinics/changes': read_changes,
+    '/api/clinics/facets': read_facets,
+    '/api/clinics/nearby': read_nearby,
+    '/api/stats': read_stats,
+    '/api/analytics/summary': read_analytics_summary,
+    '/api/analytics/regions': read_region_stats,
+    '/api/analytics/specialties': read_specialty_stats,
+    '/api/analytics/taiwan_map': read_taiwan_map,
+}
+
+def read_response(read):
+    """執行讀取查詢並產生 JSON 回應"""
+    try:
+        payload, headers = read(db, request.args)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), getattr(e, 'status_code', 400)
+    
+    response = jsonify(payload)
+    response.headers.update(headers)
+    return response
+
+# 診所 API
+@api.route('/api/clinics', methods=['GET'])
+@replica.reads
+@versioned
+def get_clinics():
+    return read_response(read_clinics)
+
+@api.route('/api/clinics', methods=['POST'])
+def create_clinic():
+    if session.get('role') != 'admin':
+        return jsonify({'error': '權限不足'}), 403
+    
+    try:
+        data = request.get_json()
+        
+        clinic = Clinic(
+            region=data.get('region'),
+            district=data.get('district'),
+            name=data.get('name'),
+            health_mall=data.get('health_mall', '否'),
+            hundred_position=data.get('hundred_position', '否'),
+            media_items=data.get('media_items'),
+            specialties=data.get('specialties'),
+            address=data.get('address'),
+            phone=data.get('phone'),
+            contact_person=data.get('contact_person'),
+            business_hours=data.get('business_hours'),
+            note=data.get('note')
+        )
+        
+        db.session.add(clinic)
+        db.session.commit()
+        
+        return jsonify({'success': True, 'id': clinic.id})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'儲存失敗: {str(e)}'}), 500
+
+@api.route('/api/clinics/<int:clinic_id>', methods=['GET'])
+@replica.reads
+def get_clinic(clinic_id):
+    clinic = Clinic.query.get_or_404(clinic_id)
+    return jsonify(clinic_to_dict(clinic))
+
+@api.route('/api/clinics/<int:clinic_id>', methods=['PUT'])
+def update_clinic(clinic_id):
+    if session.get('role') != 'admin':
+        return jsonify({'error': '權限不足'}), 403
+    
+    try:
+        clinic = Clinic.query.get_or_404(clinic_id)
+        data = request.get_json()
+        
+        clinic.region = data.get('region')
+        clinic.district = data.get('district')
+        clinic.name = data.get('name')
+        clinic.health_mall = data.get('health_mall', '否')
+        clinic.hundred_position = data.get('hundred_position', '否')
+        clinic.media_items = data.get('media_items')
+        clinic.specialties = data.get('specialties')
+        clinic.address = data.get('address')
+        clinic.phone = data.get('phone')
+        clinic.contact_person = data.get('contact_person')
+        clinic.business_hours = data.get('business_hours')
+        clinic.note = data.get('note')
+        
+        db.session.commit()
+        
+        return jsonify({'success': True})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'更新失敗: {str(e)}'}), 500
+
+@api.route('/api/clinics/<int:clinic_id>', methods=['PATCH'])
+def patch_clinic(clinic_id):
+    """部分更新：只寫入有傳送的欄位"""
+    if session.get('role') != 'admin':
+        return jsonify({'error': '權限不足'}), 403
+    
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': '資料格式錯誤'}), 400
+    
+    unknown = [key for key in data if key not in CLINIC_FIELDS]
+    if unknown:
+        return jsonify({'error': f'不支援的欄位: {", ".join(unknown)}'}), 400
+    
+    clinic = Clinic.query.get_or_404(clinic_id)
+    
+    try:
+        for field, value in data.items():
+            if field in ('health_mall', 'hundred_position') and not value:
+                value = '否'
+            setattr(clinic, field, value)
+        
+        db.session.commit()
+        
+        return jsonify({'success': True, 'clinic': clinic_to_dict(clinic)})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'更新失敗: {str(e)}'}), 500
+
+@api.route('/api/clinics/<int:clinic_id>', methods=['DELETE'])
+def delete_clinic(clinic_id):
+    if session.get('role') != 'admin':
+        return jsonify({'error': '權限不足'}), 403
+    
+    clinic = Clinic.query.get_or_404(clinic_id)
+    db.session.delete(clinic)
+    db.session.commit()
+    
+    return jsonify({'success': True})
+
+@api.route('/api/clinics/bulk', methods=['POST'])
+def bulk_update_clinics():
+    """
+    批次修改媒體項目、健康醫購、百位（僅限管理員）
+    JSON 內容：{"ids": [1, 2]} 或 {"filter": {"region": ...}}，加上 {"patch": {"health_mall": "是"}}
+    """
+    if session.get('role') != 'admin':
+        return jsonify({'error': '權限不足'}), 403
+    
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': '資料格式錯誤'}), 400
+    
+    try:
+        values = bulk.parse_patch(data.get('patch'))
+        if 'ids' in data:
+            target = Clinic.id.in_(bulk.parse_ids(data['ids']))
+        else:
+            filters = data.get('filter')
+            if not isinstance(filters, dict) or not any(filters.get(key) for key in FILTER_PARAMS):
+                raise bulk.BulkError(f'需提供 ids 或篩選條件（{", ".join(FILTER_PARAMS)}）')
+            unknown = [key for key in filters if key not in FILTER_PARAMS]
+            if unknown:
+                raise bulk.BulkError(f'不支援的篩選條件: {", ".join(unknown)}')
+            query, _ = filter_clinics(filters)
+            target = Clinic.id.in_(query.with_entities(Clinic.id).order_by(None))
+    except bulk.BulkError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        matched, updated = bulk.bulk_update(db.session, Clinic, ClinicStat.__table__, target, values)
+        db.session.commit()
+        
+        return jsonify({'success': True, 'matched': matched, 'updated': updated})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'批次修改失敗: {str(e)}'}), 500
+
+@api.route('/api/clinics/facets')
+@replica.reads
+@versioned
+def get_clinic_facets():
+    return read_response(read_facets)
+
+@api.route('/api/clinics/changes')
+@replica.reads
+@versioned
+def get_clinic_changes():
+    return read_response(read_changes)
+
+@api.route('/api/clinics/nearby')
+@replica.reads
+@versioned
+def get_nearby_clinics():
+    return read_response(read_nearby)
+
+@api.route('/api/clinics/duplicates')
+@replica.reads
+@versioned
+def get_duplicates():
+    """疑似重複的診所群組（可依縣市篩選、調整相似度門檻）"""
+    try:
+        threshold = float(request.args.get('threshold', dedup.DEFAULT_THRESHOLD))
+    except ValueError:
+        return jsonify({'error': 'threshold 必須是數字'}), 400
+    if not 0 < threshold <= 1:
+        return jsonify({'error': 'threshold 必須介於 0 與 1 之間'}), 400
+    try:
+        limit = parse_limit(request.args.get('limit'))
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    groups = dedup.find_duplicates(db, Clinic, request.args.get('region') or None, threshold)
+    total = len(groups)
+    if limit:
+        groups = groups[:limit]
+    
+    ids = [clinic_id for group in groups for clinic_id in group['ids']]
+    clinics = {c.id: c for c in Clinic.query.filter(Clinic.id.in_(ids))} if ids else {}
+    
+    response = jsonify({
+        'threshold': threshold,
+        'groups': [
+            {'score': group['score'], 'clinics': [clinic_to_dict(clinics[i]) for i in group['ids'] if i in clinics]}
+            for group in groups
+        ]
+    })
+    response.headers['X-Total-Count'] = str(total)
+    return response
+
+@api.route('/api/clinics/merge', methods=['POST'])
+def merge_clinics():
+    """合併重複診所：keep 保留，merge 中的診所資料併入後刪除"""
+    if session.get('role') != 'admin':
+        return jsonify({'error': '權限不足'}), 403
+    
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': '資料格式錯誤'}), 400
+    
+    keep_id = data.get('keep')
+    merge_ids = data.get('merge')
+    if (not isinstance(keep_id, int) or not isinstance(merge_ids, list) or not merge_ids
+            or not all(isinstance(i, int) for i in merge_ids)):
+        return jsonify({'error': '需提供 keep（診所 id）與 merge（診所 id 陣列）'}), 400
+    if keep_id in merge_ids:
+        return jsonify({'error': 'merge 不可包含 keep'}), 400
+    
+    keep = Clinic.query.get_or_404(keep_id)
+    others = Clinic.query.filter(Clinic.id.in_(merge_ids)).order_by(Clinic.id).all()
+    missing = set(merge_ids) - {c.id for c in others}
+    if missing:
+        return jsonify({'error': f'找不到診所: {", ".join(str(i) for i in sorted(missing))}'}), 404
+    
+    try:
+        dedup.merge_clinics(db, keep, others, CLINIC_FIELDS)
+        db.session.commit()
+        
+        return jsonify({'success': True, 'clinic': clinic_to_dict(keep)})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'合併失敗: {str(e)}'}), 500
+
+@api.route('/api/stats')
+@replica.reads
+@versioned
+def get_stats():
+    return read_response(read_stats)
+
+@api.route('/api/analytics/summary')
+@replica.reads
+@versioned
+def get_analytics_summary():
+    """儀表板所需統計（單次請求）"""
+    return read_response(read_analytics_summary)
+
+@api.route('/api/analytics/regions')
+@replica.reads
+@versioned
+def get_region_stats():
+    """各縣市診所數量統計"""
+    return read_response(read_region_stats)
+
+@api.route('/api/analytics/specialties')
+@replica.reads
+@versioned
+def get_specialty_stats():
+    """科別統計（處理複選）"""
+    return read_response(read_specialty_stats)
+
+@api.route('/api/analytics/taiwan_map')
+@replica.reads
+@versioned
+def get_taiwan_map_data():
+    """台灣地圖資料（縣市對應）"""
+    return read_response(read_taiwan_map)
+
+# 匯出路由
+@api.route('/api/export', methods=['GET'])
+@replica.reads
+def export_data():
+    """匯出診所資料"""
+    from export import EXPORT_FIELDS, EXPORT_FORMATS
+    
+    # 套用篩選條件（與列表頁相同的邏輯）
+    query, _ = filter_clinics(request.args)
+    
+    export_format = request.args.get('format', 'xlsx')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'不支援的匯出格式: {export_format}'}), 400
+    
+    if query.with_entities(Clinic.id).first() is None:
+        return jsonify({'error': '沒有符合條件的資料'}), 400
+    
+    # 只選取匯出欄位，並以 yield_per 分批讀取，不一次載入全部資料
+    rows = query.with_entities(
+        *[getattr(Clinic, field) for field in EXPORT_FIELDS]
+    ).order_by(Clinic.id).yield_per(EXPORT_BATCH_SIZE)
+    
+    generate, mimetype = EXPORT_FORMATS[export_format]
+    
+    # 產生檔名
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f'診所清單_{timestamp}.{export_format}'
+    
+    response = Response(stream_with_context(generate(rows)), mimetype=mimetype)
+    response.headers['Content-Disposition'] = (
+        f"attachment; filename=clinics_{timestamp}.{export_format}; "
+        f"filename*=UTF-8''{quote(filename)}"
+    )
+    return response
+
+def run_export(progress, params, export_format, path):
+    """背景匯出：依 id 分批讀取並寫入檔案"""
+    from export import EXPORT_FIELDS, write_export
+    
+    query, _ = filter_clinics(params)
+    total = query.order_by(None).count()
+    progress(0, total, force=True)
+    
+    def counted(rows):
+        for processed, row in enumerate(rows, 1):
+            yield row
+            progress(processed)
+    
+    rows = iter_keyset(
+        query.with_entities(Clinic.id, *[getattr(Clinic, field) for field in EXPORT_FIELDS]),
+        Clinic.id, EXPORT_BATCH_SIZE
+    )
+    write_export(counted(rows), path, export_format)
+    progress(total, force=True)
+    
+    return {'success': True, 'exported': total}
+
+@api.route('/api/export', methods=['POST'])
+def create_export_job():
+    """建立背景匯出工作，立即回傳工作 id"""
+    from export import EXPORT_FORMATS
+    
+    params = request.get_json(silent=True) or {}
+    export_format = params.pop('format', 'xlsx')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'不支援的匯出格式: {export_format}'}), 400
+    
+    query, _ = filter_clinics(params)
+    if query.with_entities(Clinic.id).first() is None:
+        return jsonify({'error': '沒有符合條件的資料'}), 400
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    job_id = uuid.uuid4().hex
+    path = jobs.job_path(job_id, f'.{export_format}')
+    job_id = current_app.extensions['job_runner'].submit(
+        'export', run_export, params, export_format, path,
+        job_id=job_id, file_path=path, file_name=f'診所清單_{timestamp}.{export_format}'
+    )
+    
+    return jsonify({'success': True, 'job_id': job_id}), 202
+
+# 背景工作
+@api.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """查詢背景工作進度"""
+    job = Job.query.get_or_404(job_id)
+    return jsonify(jobs.job_to_dict(job))
+
+@api.route('/api/jobs/<job_id>/download')
+def download_job_file(job_id):
+    """下載已完成的匯出檔案"""
+    job = Job.query.get_or_404(job_id)
+    if job.status != 'done' or not job.file_path or not os.path.exists(job.file_path):
+        return jsonify({'error': '檔案尚未產生或已過期'}), 404
+    
+    return send_file(job.file_path, as_attachment=True, download_name=job.file_name)
+
+def run_import(progress, path, mode, key):
+    """背景匯入，完成後刪除暫存檔案"""
+    from import_data import import_clinics
+    
+    try:
+        locator = geo.Locator(db.session, GeocodeCache.__table__, geo.load_geocoder())
+        return import_clinics(
+            path, db, Clinic, ClinicStat.__table__, mode=mode, key=key, progress=progress,
+            locate=lambda rows: geo.locate_rows(locator, rows)
+        )
+    finally:
+        os.remove(path)
+
+# 匯入路由
+@api.route('/api/import', methods=['POST'])
+def import_data():
+    """匯入診所資料"""
+    from import_data import IMPORT_MODES, UPSERT_KEYS
+    
+    if session.get('role') != 'admin':
+        return jsonify({'error': '權限不足'}), 403
+    
+    if 'file' not in request.files:
+        return jsonify({'error': '沒有上傳檔案'}), 400
+    
+    file = request.files['file']
+    
+    if file.filename == '':
+        return jsonify({'error': '沒有選擇檔案'}), 400
+    
+    if not file.filename.endswith('.xlsx'):
+        return jsonify({'error': '只接受 .xlsx 格式'}), 400
+    
+    # 匯入模式：insert（全部新增）或 upsert（依比對欄位更新既有資料）
+    mode = request.form.get('mode', 'insert')
+    key = request.form.get('key', 'name_address')
+    
+    if mode not in IMPORT_MODES:
+        return jsonify({'error': f'不支援的匯入模式: {mode}'}), 400
+    if key not in UPSERT_KEYS:
+        return jsonify({'error': f'不支援的比對欄位: {key}'}), 400
+    
+    # 儲存暫存檔案（每個工作使用獨立檔名），交由背景工作匯入
+    job_id = uuid.uuid4().hex
+    temp_path = jobs.job_path(job_id, '_' + secure_filename(file.filename))
+    file.save(temp_path)
+    
+    job_id = current_app.extensions['job_runner'].submit('import', run_import, temp_path, mode, key, job_id=job_id)
+    
+    return jsonify({'success': True, 'job_id': job_id}), 202
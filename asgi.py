@@ -0,0 +1,164 @@
+"""
+ASGI 入口：uvicorn asgi:app
+- 讀取 API（診所列表、統計、分析）以非同步引擎（aiosqlite / asyncpg）執行，等待資料庫時不佔用執行緒，
+  單一程序可同時服務大量儀表板使用者；查詢本身與 Flask 路由共用 api.py 的 read_* 函式
+- 其餘路由（寫入、匯入、匯出、頁面）交給原本的 Flask 應用程式（WsgiToAsgi，在執行緒池中執行）
+- ETag / 304 與回應快取和 WSGI 模式一致，且共用同一份快取；計量（/metrics）同樣記錄
+- 設定 DATABASE_READ_URL 時讀取 API 改由複本處理；複本的資料版本低於用戶端 cookie 記錄的寫入版本時改用主資料庫
+原本的 WSGI 模式（gunicorn app:app）不受影響
+"""
+import random
+from urllib.parse import parse_qsl
+from asgiref.wsgi import WsgiToAsgi
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import is_resource_modified, parse_cookie
+from werkzeug.wrappers import Response
+from app import create_app, DATABASE_URL, DATABASE_READ_URLS, IMPORT_STARTED
+from api import READ_ENDPOINTS, response_cache
+from models import DataVersion
+from pagination import PaginationError
+import cache
+import compression
+import db_config
+import metrics
+import replica
+
+engine = create_async_engine(db_config.async_url(DATABASE_URL), **db_config.async_engine_options(DATABASE_URL))
+db_config.configure(engine.sync_engine)
+
+# 唯讀複本的非同步引擎
+read_engines = [
+    create_async_engine(db_config.async_url(url), **db_config.async_engine_options(url)) for url in DATABASE_READ_URLS
+]
+for read_engine in read_engines:
+    db_config.configure(read_engine.sync_engine)
+
+flask_app = create_app()
+wsgi_app = WsgiToAsgi(flask_app)
+
+
+class SessionDB:
+    """提供 db.session 介面，讓共用的查詢函式在 run_sync 中使用非同步引擎的 session"""
+
+    def __init__(self, session):
+        self.session = session
+
+
+def request_environ(scope):
+    """條件式請求與壓縮判斷所需的最小 WSGI environ"""
+    environ = {'REQUEST_METHOD': scope['method']}
+    for name, value in scope['headers']:
+        if name in (b'if-none-match', b'if-modified-since', b'accept-encoding'):
+            environ['HTTP_' + name.decode('latin-1').upper().replace('-', '_')] = value.decode('latin-1')
+    return environ
+
+
+def request_cookies(scope):
+    """解析請求的 cookie"""
+    for name, value in scope['headers']:
+        if name == b'cookie':
+            return parse_cookie(value.decode('latin-1'))
+    return {}
+
+
+async def read_session(scope):
+    """
+    開啟讀取用的 session 並取得資料版本，回傳 (session, 版本, 修改時間)
+    有複本時隨機使用一個複本；複本版本低於用戶端寫入後的版本（read-your-writes）時改用主資料庫
+    """
+    required = replica.required_version(request_cookies(scope)) if read_engines else 0
+    targets = [random.choice(read_engines)] if read_engines else []
+    for target in targets + [engine]:
+        session = AsyncSession(target)
+        version, modified = await session.run_sync(
+            lambda s: cache.current_version(SessionDB(s), DataVersion)
+        )
+        if target is engine or version >= required:
+            return session, version, modified
+        await session.close()
+
+
+async def send_response(send, response, head=False, request_stats=None):
+    """以 ASGI 送出 werkzeug Response（request_stats 為 (統計, token, 路徑, 方法) 時一併記錄計量）"""
+    body = b'' if head else response.get_data()
+    if request_stats:
+        stats, token, path, method = request_stats
+        metrics.finish(stats, token, path, method, response.status_code, len(body), flask_app.logger)
+        metrics.first_request(IMPORT_STARTED)
+    await send({
+        'type': 'http.response.start',
+        'status': response.status_code,
+        'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in response.headers.items()],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def json_body(payload):
+    """與 Flask jsonify 相同的 JSON 輸出"""
+    with flask_app.app_context():
+        return flask_app.json.response(payload).get_data()
+
+
+async def handle_read(scope, send, read):
+    """非同步讀取 API：版本檢查 → 304 / 快取 / 查詢"""
+    path = scope['path']
+    args = MultiDict(parse_qsl(scope['query_string'].decode('utf-8'), keep_blank_values=True))
+    environ = request_environ(scope)
+    stats, token = metrics.begin()
+    request_stats = (stats, token, path, scope['method'])
+
+    session, version, modified = await read_session(scope)
+    async with session:
+        etag = cache.etag_for(version)
+
+        if not is_resource_modified(environ, etag=etag, last_modified=modified):
+            response = Response(status=304)
+        else:
+            key = cache.cache_key(version, path, args)
+            cached = response_cache.get(key)
+            if cached is None:
+                try:
+                    payload, headers = await session.run_sync(lambda s: read(SessionDB(s), args))
+                except PaginationError as e:
+                    response = Response(
+                        json_body({'error': str(e)}), status=getattr(e, 'status_code', 400), mimetype='application/json'
+                    )
+                    await send_response(send, response, request_stats=request_stats)
+                    return
+                cached = (json_body(payload), 'application/json', list(headers.items()))
+                response_cache.set(key, cached)
+            data, mimetype, headers = cached
+            response = Response(data, mimetype=mimetype, headers=headers)
+
+    response = compression.compress_response(cache.finish(response, etag, modified), environ.get('HTTP_ACCEPT_ENCODING'))
+    await send_response(send, response, head=scope['method'] == 'HEAD', request_stats=request_stats)
+
+
+async def lifespan(receive, send):
+    """啟動 / 關閉時的處理（關閉時釋放非同步連線池）"""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await engine.dispose()
+            for read_engine in read_engines:
+                await read_engine.dispose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    read = READ_ENDPOINTS.get(scope.get('path'))
+    # ?profile=1 需要登入狀態，交給 Flask 處理
+    profile = b'profile=1' in scope.get('query_string', b'')
+    if scope['type'] == 'http' and read and scope['method'] in ('GET', 'HEAD') and not profile:
+        await handle_read(scope, send, read)
+        return
+
+    await wsgi_app(scope, receive, send)
@@ -0,0 +1,310 @@
+"""
+效能基準測試（SQLite）
+  python3 benchmark.py                              10k、100k 筆
+  python3 benchmark.py --sizes 10000,100000,1000000
+  python3 benchmark.py --save-baseline              將本次結果存為基準
+測試資料以 seed_data.py 產生並快取在 BENCH_DIR（預設系統暫存目錄下的 clinic_bench），
+每種筆數在獨立的子程序中以複本資料庫執行，互不影響
+項目：診所列表（各篩選 / 排序）、各統計分析 API、匯出（csv / jsonl / xlsx）、匯入，
+以及冷啟動（全新子程序載入 app 模組、第一個請求完成的時間）
+結果與基準檔（預設 benchmark_baseline.json）比較，時間或記憶體超過容許範圍時以結束碼 1 結束
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SEED_SCRIPT = os.path.join(ROOT, 'seed_data.py')
+
+BENCH_DIR = os.environ.get('BENCH_DIR', os.path.join(tempfile.gettempdir(), 'clinic_bench'))
+BASELINE_PATH = 'benchmark_baseline.json'
+
+DEFAULT_SIZES = (10000, 100000)
+
+# 匯入測試的最大筆數
+MAX_IMPORT_ROWS = 100000
+
+# 超過此筆數時不測不分頁的完整列表
+MAX_FULL_LIST = 100000
+
+# 時間 / 記憶體超過基準的比例視為退步
+DEFAULT_TOLERANCE = 0.25
+
+# 差距小於此秒數時不視為退步（避免極短項目的誤差）
+MIN_REGRESSION_SECONDS = 0.005
+
+# 讀取項目：(名稱, 路徑)
+READ_CASES = [
+    ('list', '/api/clinics?limit=50'),
+    ('list_region', '/api/clinics?limit=50&region=臺北市'),
+    ('list_specialty', '/api/clinics?limit=50&specialty=小兒科'),
+    ('list_media_item', '/api/clinics?limit=50&media_item=藥袋'),
+    ('list_search', '/api/clinics?limit=50&search=仁愛小兒'),
+    ('list_sort_name', '/api/clinics?limit=50&sort=name'),
+    ('list_sort_updated', '/api/clinics?limit=50&sort=updated_at&order=desc'),
+    ('list_columns', '/api/clinics?limit=500&fields=name,region,district,specialties&shape=columns'),
+    ('stats', '/api/stats'),
+    ('analytics_summary', '/api/analytics/summary'),
+    ('analytics_regions', '/api/analytics/regions'),
+    ('analytics_specialties', '/api/analytics/specialties'),
+    ('analytics_taiwan_map', '/api/analytics/taiwan_map'),
+    ('nearby', '/api/clinics/nearby?lat=25.0330&lng=121.5654&radius=3'),
+]
+
+
+def dataset_path(size, seed):
+    return os.path.join(BENCH_DIR, f'clinics_{size}_{seed}.db')
+
+
+def import_path(rows, seed):
+    return os.path.join(BENCH_DIR, f'import_{rows}_{seed}.xlsx')
+
+
+def prepare(size, seed):
+    """產生（或沿用快取的）測試資料庫與匯入檔"""
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    path = dataset_path(size, seed)
+    if not os.path.exists(path):
+        print(f'產生 {size} 筆測試資料…', file=sys.stderr)
+        env = dict(os.environ, DATABASE_URL=f'sqlite:///{path}.tmp')
+        subprocess.run(
+            [sys.executable, SEED_SCRIPT, str(size), '--seed', str(seed)],
+            env=env, check=True, stdout=subprocess.DEVNULL
+        )
+        os.replace(f'{path}.tmp', path)
+
+    rows = min(size, MAX_IMPORT_ROWS)
+    xlsx = import_path(rows, seed)
+    if not os.path.exists(xlsx):
+        subprocess.run(
+            [sys.executable, SEED_SCRIPT, str(rows), '--seed', str(seed + 1), '--xlsx', xlsx],
+            check=True, stdout=subprocess.DEVNULL
+        )
+    return path, xlsx
+
+
+def measure(func, repeat):
+    """執行 repeat 次取中位數時間，另以 tracemalloc 執行一次取記憶體峰值；回傳 (秒, 處理單位數, 峰值 MB)"""
+    units = func()
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        units = func()
+        times.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(times), units, peak / 1024 / 1024
+
+
+def run_worker(size, xlsx, repeat):
+    """子程序：對 DATABASE_URL 指定的複本資料庫執行所有項目"""
+    from api import response_cache
+    from app import create_app
+    from import_data import import_clinics
+    from models import db, Clinic, ClinicStat, GeocodeCache
+    import geo
+
+    app = create_app()
+    client = app.test_client()
+    results = {}
+
+    def request(path):
+        def run():
+            # 每次都清除回應快取，量測實際查詢
+            response_cache.clear()
+            response = client.get(path)
+            if response.status_code != 200:
+                raise RuntimeError(f'{path} 回應 {response.status_code}')
+            response.get_data()
+            return 1
+        return run
+
+    def export(export_format):
+        def run():
+            response = client.get(f'/api/export?format={export_format}')
+            for _ in response.response:
+                pass
+            response.close()
+            return size
+        return run
+
+    cases = [(name, request(path), repeat, 'req') for name, path in READ_CASES]
+    if size <= MAX_FULL_LIST:
+        cases.append(('list_all', request('/api/clinics'), repeat, 'req'))
+    cases += [
+        ('export_csv', export('csv'), 1, 'rows'),
+        ('export_jsonl', export('jsonl'), 1, 'rows'),
+        ('export_xlsx', export('xlsx'), 1, 'rows'),
+    ]
+
+    for name, func, times, unit in cases:
+        seconds, units, peak = measure(func, times)
+        results[name] = {'seconds': seconds, 'throughput': units / seconds, 'unit': unit, 'peak_mb': peak}
+        print(f'  {name} {seconds:.4f}s', file=sys.stderr)
+
+    # 匯入（新增模式，寫入同一份複本資料庫；放在最後不影響其他項目）
+    with app.app_context():
+        locator = geo.Locator(db.session, GeocodeCache.__table__, geo.load_geocoder())
+        tracemalloc.start()
+        started = time.perf_counter()
+        result = import_clinics(
+            xlsx, db, Clinic, ClinicStat.__table__,
+            locate=lambda rows: geo.locate_rows(locator, rows)
+        )
+        seconds = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    if not result.get('success'):
+        raise RuntimeError(f'匯入失敗: {result}')
+    results['import'] = {
+        'seconds': seconds, 'throughput': result['inserted'] / seconds, 'unit': 'rows', 'peak_mb': peak / 1024 / 1024
+    }
+    return results
+
+
+def run_startup():
+    """子程序：量測冷啟動，回傳 {階段: 秒}（載入 app 模組、建立應用程式、載入起算到第一個請求完成）"""
+    started = time.perf_counter()
+    from app import create_app
+    imported = time.perf_counter()
+    app = create_app()
+    created = time.perf_counter()
+    response = app.test_client().get(READ_CASES[0][1])
+    if response.status_code != 200:
+        raise RuntimeError(f'{READ_CASES[0][1]} 回應 {response.status_code}')
+    return {'import': imported - started, 'create_app': created - imported, 'first_request': time.perf_counter() - started}
+
+
+def measure_startup(env, repeat):
+    """以 repeat 個全新子程序量測冷啟動，各階段取中位數"""
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, __file__, '--startup'], env=env, check=True, stdout=subprocess.PIPE, text=True
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    results = {}
+    for phase in ('import', 'first_request'):
+        seconds = statistics.median(run[phase] for run in runs)
+        results[f'startup_{phase}'] = {'seconds': seconds, 'throughput': 1 / seconds, 'unit': 'starts', 'peak_mb': 0}
+        print(f'  startup_{phase} {seconds:.4f}s', file=sys.stderr)
+    return results
+
+
+def run_size(size, seed, repeat):
+    """在子程序中對複本資料庫執行一種筆數的所有項目"""
+    path, xlsx = prepare(size, seed)
+    work = os.path.join(BENCH_DIR, f'work_{size}.db')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(work + suffix):
+            os.remove(work + suffix)
+    shutil.copyfile(path, work)
+
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{work}')
+    try:
+        startup = measure_startup(env, repeat)
+        output = subprocess.run(
+            [sys.executable, __file__, '--worker', '--size', str(size), '--xlsx', xlsx, '--repeat', str(repeat)],
+            env=env, check=True, stdout=subprocess.PIPE, text=True
+        ).stdout
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(work + suffix):
+                os.remove(work + suffix)
+    results = json.loads(output.strip().splitlines()[-1])
+    results.update(startup)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """與基準比較，回傳退步項目 [(筆數, 項目, 說明)]"""
+    regressions = []
+    for size, cases in results.items():
+        for name, result in cases.items():
+            base = baseline.get(size, {}).get(name)
+            if not base:
+                continue
+            if (result['seconds'] > base['seconds'] * (1 + tolerance)
+                    and result['seconds'] - base['seconds'] > MIN_REGRESSION_SECONDS):
+                regressions.append((size, name, f"時間 {base['seconds']:.4f}s → {result['seconds']:.4f}s"))
+            if result['peak_mb'] > base['peak_mb'] * (1 + tolerance) and result['peak_mb'] - base['peak_mb'] > 1:
+                regressions.append((size, name, f"記憶體 {base['peak_mb']:.1f}MB → {result['peak_mb']:.1f}MB"))
+    return regressions
+
+
+def report(results, baseline):
+    """印出結果表格（含與基準的差異）"""
+    for size, cases in results.items():
+        print(f'\n== {int(size):,} 筆')
+        print(f"{'項目':<24}{'時間(s)':>10}{'吞吐量':>18}{'記憶體(MB)':>12}{'基準差異':>10}")
+        for name, result in cases.items():
+            base = baseline.get(size, {}).get(name)
+            diff = f"{(result['seconds'] / base['seconds'] - 1) * 100:+.0f}%" if base else '-'
+            throughput = f"{result['throughput']:,.1f} {result['unit']}/s"
+            print(f"{name:<24}{result['seconds']:>10.4f}{throughput:>18}{result['peak_mb']:>12.1f}{diff:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='診所管理系統效能基準測試')
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES), help='資料筆數（逗號分隔）')
+    parser.add_argument('--seed', type=int, default=42, help='測試資料亂數種子')
+    parser.add_argument('--repeat', type=int, default=5, help='讀取項目的重複次數（取中位數）')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='基準檔路徑')
+    parser.add_argument('--save-baseline', action='store_true', help='將本次結果存為基準')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='容許的退步比例（預設 0.25）')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--startup', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--xlsx', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.startup:
+        print(json.dumps(run_startup()))
+        return 0
+
+    if args.worker:
+        print(json.dumps(run_worker(args.size, args.xlsx, args.repeat)))
+        return 0
+
+    results = {}
+    for size in (int(s) for s in args.sizes.split(',') if s):
+        print(f'執行 {size} 筆…', file=sys.stderr)
+        results[str(size)] = run_size(size, args.seed, args.repeat)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    report(results, baseline)
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2, sort_keys=True)
+        print(f'\n✓ 已儲存基準：{args.baseline}')
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print('\n⚠️  效能退步：')
+        for size, name, detail in regressions:
+            print(f'  {int(size):,} 筆 {name}：{detail}')
+        return 1
+    if baseline:
+        print('\n✓ 未超過基準容許範圍')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
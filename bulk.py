@@ -0,0 +1,91 @@
+"""
+批次修改（媒體項目、健康醫購、百位）
+- 對象為 id 清單或篩選條件，在同一交易中以單一 UPDATE 寫入，只更新值確實不同的診所
+- 直接執行的 UPDATE 不經過 ORM 事件，統計表與媒體項目關聯表在此一併更新；
+  資料版本（cache.py 的 do_orm_execute）與異動記錄（changelog.py 的觸發器）自動涵蓋
+- PostgreSQL 先以 SELECT ... FOR UPDATE 鎖定對象，讀取的舊值與 UPDATE 影響的資料一致
+"""
+from datetime import datetime
+from sqlalchemy import func, or_, select, update
+import stats
+import tags
+
+# 可批次修改的欄位
+BULK_FIELDS = ('media_items', 'health_mall', 'hundred_position')
+
+# 是 / 否 欄位的合法值
+FLAG_VALUES = ('是', '否')
+
+# 以 id 指定時的最大筆數（更多筆請改用篩選條件）
+MAX_IDS = 10000
+
+
+class BulkError(ValueError):
+    """批次修改的參數錯誤"""
+
+
+def parse_patch(patch):
+    """檢查並正規化要寫入的欄位，回傳 {欄位: 值}"""
+    if not isinstance(patch, dict) or not patch:
+        raise BulkError('patch 需為包含修改欄位的物件')
+    unknown = [field for field in patch if field not in BULK_FIELDS]
+    if unknown:
+        raise BulkError(f'不支援批次修改的欄位: {", ".join(unknown)}')
+
+    values = {}
+    for field, value in patch.items():
+        if field == 'media_items':
+            if value is not None and not isinstance(value, str):
+                raise BulkError('media_items 需為逗號分隔的字串')
+            values[field] = ','.join(tags.split_tags(value)) or None
+        else:
+            value = value or '否'
+            if value not in FLAG_VALUES:
+                raise BulkError(f'{field} 只能是「是」或「否」')
+            values[field] = value
+    return values
+
+
+def parse_ids(ids):
+    """檢查 id 清單（去除重複）"""
+    if not isinstance(ids, list) or not ids or not all(isinstance(i, int) for i in ids):
+        raise BulkError('ids 需為診所 id 陣列')
+    if len(ids) > MAX_IDS:
+        raise BulkError(f'ids 最多 {MAX_IDS} 筆，更多筆請改用篩選條件')
+    return sorted(set(ids))
+
+
+def bulk_update(session, Clinic, stat_table, target, values):
+    """
+    將 values 寫入符合 target（Clinic.id 的篩選條件）的診所，不提交
+    回傳 (符合條件的筆數, 實際更新的筆數)
+    """
+    matched = session.execute(select(func.count()).select_from(Clinic).where(target)).scalar()
+    changed = or_(*[getattr(Clinic, field).is_distinct_from(value) for field, value in values.items()])
+
+    rows = session.execute(
+        select(Clinic.id, *[getattr(Clinic, f) for f in stats.STAT_FIELDS])
+        .where(target, changed)
+        .with_for_update()
+    ).all()
+    if not rows:
+        return matched, 0
+    clinic_ids = [row[0] for row in rows]
+
+    result = session.execute(
+        update(Clinic).where(target, changed).values(updated_at=datetime.utcnow(), **values),
+        execution_options={'synchronize_session': False}
+    )
+
+    if any(field in stats.STAT_FIELDS for field in values):
+        # 寫入前後的統計貢獻：更新後的值就是 values，不必再讀取一次
+        before = stats.count_rows(row[1:] for row in rows)
+        after = stats.count_rows(
+            tuple(values.get(f, row._mapping[f]) for f in stats.STAT_FIELDS) for row in rows
+        )
+        after.subtract(before)
+        stats.apply_delta(session.connection(), stat_table, after)
+    if 'media_items' in values:
+        tags.rebuild_tags(session, Clinic, clinic_ids, fields=['media_items'])
+
+    return matched, result.rowcount
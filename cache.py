@@ -0,0 +1,165 @@
+"""
+資料版本與讀取快取
+- 任何診所 / 科別 / 媒體項目的寫入（ORM flush 或批次 insert/update/delete）都會在同一交易中遞增 data_version
+- 讀取 API 以版本號產生 ETag / Last-Modified，瀏覽器帶 If-None-Match 且版本未變時直接回 304
+- 同一版本、同一組查詢參數的回應存在 LRU 快取，版本遞增後舊項目自然失效並被淘汰
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+from flask import Response, make_response, request
+from sqlalchemy import event, insert, select, update
+from werkzeug.http import is_resource_modified
+
+# 寫入時會遞增版本的資料表
+WATCHED_TABLES = {'clinic', 'clinic_specialty', 'clinic_media_item', 'specialty', 'media_item'}
+
+# 快取保留的回應數
+CACHE_SIZE = 256
+
+# 交易中已遞增過版本的標記（存在 session.info）
+BUMPED = 'data_version_bumped'
+
+
+class LRUCache:
+    """執行緒安全的 LRU 快取"""
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.items:
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            return self.items[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+def bump_version(session, DataVersion):
+    """遞增資料版本（每個交易只遞增一次，於交易提交時一併生效）"""
+    if session.info.get(BUMPED):
+        return
+    session.info[BUMPED] = True
+
+    # 直接使用交易的連線執行，避免在 flush 過程中再次觸發 flush
+    connection = session.connection()
+    now = datetime.utcnow()
+    result = connection.execute(
+        update(DataVersion).where(DataVersion.id == 1).values(version=DataVersion.version + 1, updated_at=now)
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(DataVersion).values(id=1, version=1, updated_at=now))
+
+
+def current_version(db, DataVersion):
+    """目前的 (版本號, 最後修改時間)"""
+    row = db.session.execute(
+        select(DataVersion.version, DataVersion.updated_at).where(DataVersion.id == 1)
+    ).first()
+    if row is None:
+        return 0, None
+    return row.version, row.updated_at
+
+
+def register(session, DataVersion):
+    """建立版本列，並監聽寫入事件以遞增資料版本"""
+
+    @event.listens_for(DataVersion.__table__, 'after_create')
+    def create_version_row(target, connection, **kw):
+        connection.execute(insert(DataVersion).values(id=1, version=1, updated_at=datetime.utcnow()))
+
+    def touches_watched(objects):
+        return any(getattr(obj, '__tablename__', None) in WATCHED_TABLES for obj in objects)
+
+    @event.listens_for(session, 'after_flush')
+    def version_after_flush(sess, flush_context):
+        if touches_watched(sess.new) or touches_watched(sess.dirty) or touches_watched(sess.deleted):
+            bump_version(sess, DataVersion)
+
+    @event.listens_for(session, 'do_orm_execute')
+    def version_on_bulk_write(orm_execute_state):
+        # 匯入、關聯表重建等直接執行的 insert / update / delete
+        if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+            return
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if getattr(table, 'name', None) in WATCHED_TABLES:
+            bump_version(orm_execute_state.session, DataVersion)
+
+    @event.listens_for(session, 'after_commit')
+    @event.listens_for(session, 'after_rollback')
+    def version_reset(sess):
+        sess.info.pop(BUMPED, None)
+
+
+def etag_for(version):
+    """資料版本對應的 ETag"""
+    return f'v{version}'
+
+
+def cache_key(version, path, args):
+    """回應快取的 key（args 為 MultiDict）"""
+    return (version, path, tuple(sorted(args.items(multi=True))))
+
+
+def finish(response, etag, modified):
+    """加上版本相關標頭"""
+    response.set_etag(etag)
+    if modified:
+        response.last_modified = modified
+    # 每次使用前都須向伺服器確認版本
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def versioned(db, DataVersion, cache):
+    """
+    讀取 API 的裝飾器：加上 ETag / Last-Modified，版本未變時回 304，
+    並以 (版本, 路徑, 查詢參數) 為 key 快取回應內容（只快取 200 回應）
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            version, modified = current_version(db, DataVersion)
+            etag = etag_for(version)
+
+            if not is_resource_modified(request.environ, etag=etag, last_modified=modified):
+                response = Response(status=304)
+            else:
+                key = cache_key(version, request.path, request.args)
+                cached = cache.get(key)
+                if cached is None:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    cached = (response.get_data(), response.mimetype, [
+                        (name, value) for name, value in response.headers.items()
+                        if name.startswith('X-')
+                    ])
+                    cache.set(key, cached)
+                data, mimetype, headers = cached
+                response = Response(data, mimetype=mimetype, headers=headers)
+
+            return finish(response, etag, modified)
+
+        return wrapper
+
+    return decorator
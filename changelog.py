@@ -0,0 +1,187 @@
+"""
+診所異動記錄與增量同步
+- clinic_change 為只增不改的記錄表，id 單調遞增即為同步版本號
+- 由資料庫觸發器在 clinic 新增、更新、刪除時寫入，API、匯入、批次更新、地理編碼等所有寫入路徑都會記錄
+- 更新只在實際有欄位改變時記錄（只改 updated_at 不算），並記下改變的欄位
+- PostgreSQL 觸發器先取得交易層級 advisory lock，讓版本號順序與提交順序一致，
+  客戶端以 since 讀取時不會漏掉較晚提交、版本號卻較小的異動
+- 用戶端先取得完整列表（回應標頭 X-Change-Version），之後以 /api/clinics/changes?since= 取得差異；
+  since 早於保留範圍（已清除的記錄或開始記錄之前）時回應 410，需重新取得完整列表
+"""
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import delete, event, func, inspect, insert, select
+from pagination import PaginationError
+
+# 每次同步回傳的最大異動筆數
+DEFAULT_LIMIT = 1000
+
+# 記錄保留天數（manage.py prune-changes）
+RETENTION_DAYS = int(os.environ.get('CHANGE_LOG_RETENTION_DAYS', '90'))
+
+# 不列入異動欄位的欄位
+IGNORED_COLUMNS = ('id', 'created_at', 'updated_at')
+
+# PostgreSQL advisory lock 的 key（任意固定整數）
+CHANGE_LOCK_ID = 20260419
+
+# 標記「此版本之前的記錄不完整」（開始記錄、還原資料等），clinic_id 為空
+RESET = 'reset'
+
+
+class ChangesExpired(PaginationError):
+    """since 早於保留的記錄，需重新取得完整資料"""
+    status_code = 410
+
+
+def tracked_columns(Clinic):
+    """列入異動欄位的 clinic 欄位名稱"""
+    return [column.name for column in Clinic.__table__.columns if column.name not in IGNORED_COLUMNS]
+
+
+def sqlite_ddl(columns):
+    """SQLite 觸發器（更新時以 IS NOT 逐欄比較，組成逗號分隔的異動欄位）"""
+    changed = ' OR '.join(f'old.{c} IS NOT new.{c}' for c in columns)
+    fields = ' || '.join(f"CASE WHEN old.{c} IS NOT new.{c} THEN '{c},' ELSE '' END" for c in columns)
+    return [
+        "DROP TRIGGER IF EXISTS clinic_change_ai",
+        "DROP TRIGGER IF EXISTS clinic_change_au",
+        "DROP TRIGGER IF EXISTS clinic_change_ad",
+        """CREATE TRIGGER clinic_change_ai AFTER INSERT ON clinic BEGIN
+            INSERT INTO clinic_change (clinic_id, action, changed_at) VALUES (new.id, 'create', CURRENT_TIMESTAMP);
+        END""",
+        f"""CREATE TRIGGER clinic_change_au AFTER UPDATE ON clinic WHEN {changed} BEGIN
+            INSERT INTO clinic_change (clinic_id, action, fields, changed_at)
+            VALUES (new.id, 'update', rtrim({fields}, ','), CURRENT_TIMESTAMP);
+        END""",
+        """CREATE TRIGGER clinic_change_ad AFTER DELETE ON clinic BEGIN
+            INSERT INTO clinic_change (clinic_id, action, changed_at) VALUES (old.id, 'delete', CURRENT_TIMESTAMP);
+        END""",
+    ]
+
+
+def postgres_ddl(columns):
+    """PostgreSQL 觸發器函式（以 IS DISTINCT FROM 逐欄比較）"""
+    fields = ', '.join(f"CASE WHEN OLD.{c} IS DISTINCT FROM NEW.{c} THEN '{c}' END" for c in columns)
+    return [
+        f"""CREATE OR REPLACE FUNCTION clinic_change_log() RETURNS trigger AS $$
+        DECLARE
+            changed text;
+        BEGIN
+            PERFORM pg_advisory_xact_lock({CHANGE_LOCK_ID});
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO clinic_change (clinic_id, action, changed_at)
+                VALUES (NEW.id, 'create', now() AT TIME ZONE 'utc');
+            ELSIF TG_OP = 'DELETE' THEN
+                INSERT INTO clinic_change (clinic_id, action, changed_at)
+                VALUES (OLD.id, 'delete', now() AT TIME ZONE 'utc');
+            ELSE
+                changed := concat_ws(',', {fields});
+                IF changed <> '' THEN
+                    INSERT INTO clinic_change (clinic_id, action, fields, changed_at)
+                    VALUES (NEW.id, 'update', changed, now() AT TIME ZONE 'utc');
+                END IF;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql""",
+        "DROP TRIGGER IF EXISTS clinic_change_trigger ON clinic",
+        """CREATE TRIGGER clinic_change_trigger AFTER INSERT OR UPDATE OR DELETE ON clinic
+            FOR EACH ROW EXECUTE FUNCTION clinic_change_log()""",
+    ]
+
+
+def install(connection, Clinic, change_table):
+    """
+    建立（或重建）異動觸發器（可重複執行）
+    clinic 表新增欄位後需重新執行，觸發器才會比較新欄位
+    """
+    existing = inspect(connection)
+    if not existing.has_table('clinic') or not existing.has_table(change_table.name):
+        return False
+
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        statements = sqlite_ddl(tracked_columns(Clinic))
+    elif dialect == 'postgresql':
+        statements = postgres_ddl(tracked_columns(Clinic))
+    else:
+        return False
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+    return True
+
+
+def register(Clinic, change_table):
+    """db.create_all() 建立 clinic / clinic_change 表後自動建立觸發器（兩表都存在時才建立）"""
+
+    @event.listens_for(Clinic.__table__, 'after_create')
+    @event.listens_for(change_table, 'after_create')
+    def create_change_triggers(target, connection, **kw):
+        if install(connection, Clinic, change_table):
+            mark_reset(connection, change_table)
+
+
+def mark_reset(connection, change_table, min_id=None):
+    """
+    寫入起始標記：此版本之前的異動不完整，since 較小的同步請求需重新取得完整資料
+    min_id 指定標記的 id（還原資料後需大於還原前的版本，用戶端手上的 since 才會一律失效）
+    """
+    values = {'action': RESET, 'changed_at': datetime.utcnow()}
+    if min_id is not None:
+        latest = connection.execute(select(func.max(change_table.c.id))).scalar() or 0
+        values['id'] = max(min_id, latest + 1)
+    connection.execute(insert(change_table).values(**values))
+
+
+def current_version(session, change_table):
+    """目前的同步版本（最新的異動 id）"""
+    return session.execute(select(func.max(change_table.c.id))).scalar() or 0
+
+
+def oldest_since(session, change_table):
+    """仍可增量同步的最小 since（較早的記錄已清除或在開始記錄之前）"""
+    oldest = session.execute(select(func.min(change_table.c.id))).scalar()
+    reset = session.execute(
+        select(func.max(change_table.c.id)).where(change_table.c.action == RESET)
+    ).scalar()
+    if oldest is None:
+        return 0
+    return max(oldest - 1, reset or 0)
+
+
+def changes_since(session, change_table, since, limit=DEFAULT_LIMIT):
+    """
+    取得 since 之後的異動，每家診所只保留最後一個動作
+    回傳 (upsert 的 id 清單, 刪除的 id 清單, 本次同步到的版本, 是否還有更多)
+    """
+    if since < oldest_since(session, change_table):
+        raise ChangesExpired('since 早於保留的異動記錄，請重新取得完整資料')
+
+    rows = session.execute(
+        select(change_table.c.id, change_table.c.clinic_id, change_table.c.action)
+        .where(change_table.c.id > since)
+        .order_by(change_table.c.id)
+        .limit(limit + 1)
+    ).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    latest = {}
+    for _, clinic_id, action in rows:
+        if clinic_id is not None:
+            latest[clinic_id] = action
+    upserts = sorted(i for i, action in latest.items() if action != 'delete')
+    deleted = sorted(i for i, action in latest.items() if action == 'delete')
+    version = rows[-1].id if rows else max(since, current_version(session, change_table))
+    return upserts, deleted, version, has_more
+
+
+def prune(session, change_table, days=RETENTION_DAYS):
+    """刪除超過保留天數的記錄（一律保留最新一筆，維持版本號的下限），回傳刪除筆數"""
+    latest = current_version(session, change_table)
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    result = session.execute(
+        delete(change_table).where(change_table.c.changed_at < cutoff, change_table.c.id < latest)
+    )
+    return result.rowcount
@@ -0,0 +1,65 @@
+"""
+回應壓縮：依 Accept-Encoding 以 brotli（有安裝時）或 gzip 壓縮 JSON / HTML 等文字回應
+串流回應（匯出）與檔案下載不壓縮
+"""
+import gzip
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli 為選用套件
+    brotli = None
+
+# 小於此大小的回應不壓縮（壓縮效益低於額外成本）
+MIN_SIZE = 1024
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/html', 'text/css', 'text/plain', 'application/javascript')
+
+
+def choose_encoding(accept_encoding):
+    """依 Accept-Encoding 選擇壓縮方式（werkzeug MIMEAccept / 字串皆可）"""
+    accept = str(accept_encoding or '').lower()
+    offered = {part.split(';')[0].strip() for part in accept.split(',')}
+    if brotli is not None and 'br' in offered:
+        return 'br'
+    if 'gzip' in offered:
+        return 'gzip'
+    return None
+
+
+def compress_response(response, accept_encoding):
+    """壓縮 werkzeug Response（原地修改並回傳）"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(accept_encoding)
+    data = response.get_data()
+    if encoding is None or len(data) < MIN_SIZE:
+        return response
+
+    if encoding == 'br':
+        data = brotli.compress(data, quality=BROTLI_QUALITY)
+    else:
+        data = gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    # 壓縮後內容不同，ETag 改為弱比對（If-None-Match 仍以弱比對判斷版本）
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def register(app):
+    """在所有 Flask 回應套用壓縮"""
+
+    @app.after_request
+    def compress(response):
+        return compress_response(response, request.headers.get('Accept-Encoding'))
@@ -0,0 +1,132 @@
+"""
+依資料庫種類設定連線（皆可由環境變數調整）
+- SQLite：WAL 模式讓匯入寫入時仍可同時讀取，synchronous=NORMAL、mmap 與 busy timeout
+- PostgreSQL：連線池大小、溢出上限、回收時間與 pre-ping（避免使用已被伺服器關閉的連線）
+"""
+import os
+import time
+from sqlalchemy import event, text
+
+# SQLite
+SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', '5000'))  # 毫秒
+SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', '-20000'))  # 負值為 KiB
+
+# PostgreSQL
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', '30'))  # 秒
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', '1800'))  # 秒
+DB_STATEMENT_TIMEOUT = int(os.environ.get('DB_STATEMENT_TIMEOUT', '0'))  # 毫秒，0 為不限制
+
+
+def normalize_url(url):
+    """Render / Heroku 提供的 postgres:// 需改為 SQLAlchemy 使用的 postgresql://"""
+    if url.startswith('postgres://'):
+        url = url.replace('postgres://', 'postgresql://', 1)
+    return url
+
+
+def engine_options(url):
+    """create_engine 參數（SQLALCHEMY_ENGINE_OPTIONS）"""
+    if url.startswith('sqlite'):
+        # pysqlite 的 timeout 為等待鎖定的秒數，與 busy_timeout 一致
+        return {'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT / 1000}}
+
+    if url.startswith('postgresql'):
+        options = {
+            'pool_size': DB_POOL_SIZE,
+            'max_overflow': DB_MAX_OVERFLOW,
+            'pool_timeout': DB_POOL_TIMEOUT,
+            'pool_recycle': DB_POOL_RECYCLE,
+            'pool_pre_ping': True,
+        }
+        if DB_STATEMENT_TIMEOUT:
+            options['connect_args'] = {'options': f'-c statement_timeout={DB_STATEMENT_TIMEOUT}'}
+        return options
+
+    return {'pool_pre_ping': True}
+
+
+def async_url(url):
+    """非同步驅動的連線 URL（SQLite 使用 aiosqlite、PostgreSQL 使用 asyncpg）"""
+    if url.startswith('sqlite:'):
+        return url.replace('sqlite:', 'sqlite+aiosqlite:', 1)
+    if url.startswith('postgresql:') or url.startswith('postgresql+psycopg2:'):
+        return 'postgresql+asyncpg:' + url.split(':', 1)[1]
+    return url
+
+
+def async_engine_options(url):
+    """create_async_engine 參數（asyncpg 以 server_settings 設定 statement_timeout）"""
+    options = engine_options(url)
+    if url.startswith('postgresql') and DB_STATEMENT_TIMEOUT:
+        options['connect_args'] = {'server_settings': {'statement_timeout': str(DB_STATEMENT_TIMEOUT)}}
+    return options
+
+
+def sqlite_pragmas():
+    """每個新連線執行的 PRAGMA"""
+    pragmas = [
+        f'PRAGMA synchronous={SQLITE_SYNCHRONOUS}',
+        f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}',
+        f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}',
+        f'PRAGMA cache_size={SQLITE_CACHE_SIZE}',
+        'PRAGMA temp_store=MEMORY',
+    ]
+    # journal_mode 會記錄在資料庫檔案中（記憶體資料庫維持 memory 模式）
+    if SQLITE_JOURNAL_MODE:
+        pragmas.insert(0, f'PRAGMA journal_mode={SQLITE_JOURNAL_MODE}')
+    return pragmas
+
+
+def configure(engine):
+    """為引擎註冊連線設定（SQLite 於每個新連線套用 PRAGMA）"""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in sqlite_pragmas():
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def pool_status(engine):
+    """連線池狀態"""
+    pool = engine.pool
+    status = {'class': type(pool).__name__}
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        if hasattr(pool, name):
+            status[name] = getattr(pool, name)()
+    if hasattr(pool, '_max_overflow'):
+        status['max_overflow'] = pool._max_overflow
+    return status
+
+
+def health(db):
+    """資料庫連線檢查與連線池狀態"""
+    engine = db.engine
+    result = {
+        'database': engine.dialect.name,
+        'pool': pool_status(engine),
+    }
+
+    start = time.perf_counter()
+    try:
+        db.session.execute(text('SELECT 1'))
+        if engine.dialect.name == 'sqlite':
+            result['journal_mode'] = db.session.execute(text('PRAGMA journal_mode')).scalar()
+        result['status'] = 'ok'
+    except Exception as e:
+        db.session.rollback()
+        result['status'] = 'error'
+        result['error'] = str(e)
+    result['latency_ms'] = round((time.perf_counter() - start) * 1000, 2)
+
+    return result
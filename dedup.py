@@ -0,0 +1,242 @@
+"""
+重複診所偵測與合併
+- 正規化：全形 / 半形（NFKC）、空白與標點、臺 / 台，電話只保留數字（+886 轉回 0 開頭）
+- 分區（blocking）：只比對同縣市 + 區域內的資料；區內再以名稱 bigram 反向索引挑出候選，
+  每個名稱只索引最稀有的幾個 bigram（prefix filtering），「診所」等常見 bigram 不會產生候選，
+  避免整區兩兩比對
+- 另以正規化電話分區，電話相同者不論區域皆為候選
+- 相似度：名稱、地址以 bigram Dice 係數計算，電話相同加分，依可用欄位加權平均
+"""
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from sqlalchemy import select
+from tags import split_tags
+
+# 預設相似度門檻
+DEFAULT_THRESHOLD = 0.85
+
+# 欄位權重（只計入兩筆都有值的欄位）
+WEIGHTS = {'name': 0.5, 'address': 0.3, 'phone': 0.2}
+
+# 索引中已超過此數量診所的 bigram 不再用來產生候選（保護極端資料）
+MAX_POSTING = 100
+
+# 同一電話超過此數量（如總機）不視為重複依據
+MAX_PHONE_GROUP = 20
+
+# 讀取資料時每批筆數
+BATCH_SIZE = 5000
+
+PUNCTUATION = re.compile(r'[\s\-_.,，、。．·()（）\[\]【】「」/\\#＃:：;；\'"]+')
+
+
+def normalize_text(value):
+    """名稱 / 地址正規化"""
+    if not value:
+        return ''
+    value = unicodedata.normalize('NFKC', value).lower()
+    value = value.replace('臺', '台')
+    return PUNCTUATION.sub('', value)
+
+
+def normalize_phone(value):
+    """電話正規化：只保留數字，國碼 886 轉為 0 開頭"""
+    if not value:
+        return ''
+    digits = re.sub(r'\D', '', unicodedata.normalize('NFKC', value))
+    if digits.startswith('886'):
+        digits = '0' + digits[3:]
+    return digits
+
+
+def bigrams(value):
+    """字元 bigram 集合（單一字元時為該字元）"""
+    if len(value) < 2:
+        return {value} if value else set()
+    return {value[i:i + 2] for i in range(len(value) - 1)}
+
+
+def dice(a, b):
+    """Dice 係數"""
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+class Record:
+    """比對用的正規化資料"""
+    __slots__ = ('id', 'block', 'name', 'address', 'phone', 'name_grams')
+
+    def __init__(self, clinic_id, region, district, name, address, phone):
+        self.id = clinic_id
+        self.block = (normalize_text(region), normalize_text(district))
+        self.name = normalize_text(name)
+        self.address = normalize_text(address)
+        self.phone = normalize_phone(phone)
+        self.name_grams = bigrams(self.name)
+
+
+def similarity(a, b):
+    """兩筆資料的相似度（0～1）"""
+    if not a.name or not b.name:
+        return 0.0
+
+    weight = WEIGHTS['name']
+    score = weight * (1.0 if a.name == b.name else dice(a.name_grams, b.name_grams))
+    if a.address and b.address:
+        weight += WEIGHTS['address']
+        if a.address == b.address:
+            score += WEIGHTS['address']
+        else:
+            score += WEIGHTS['address'] * dice(bigrams(a.address), bigrams(b.address))
+    if a.phone and b.phone:
+        weight += WEIGHTS['phone']
+        if a.phone == b.phone:
+            score += WEIGHTS['phone']
+    return score / weight
+
+
+def name_floor(threshold):
+    """名稱相似度的下限：低於此值時即使地址、電話完全相同也達不到門檻"""
+    other = 1 - WEIGHTS['name']
+    return max(0.0, (threshold - other) / WEIGHTS['name'])
+
+
+def prefix_length(size, floor):
+    """
+    prefix filtering：bigram 依稀有程度排序後，Dice ≥ floor 的兩個名稱
+    必定在各自最稀有的前 n 個 bigram 中至少共用一個
+    """
+    jaccard = floor / (2 - floor)
+    return min(size, size - math.ceil(jaccard * size) + 1)
+
+
+def block_candidates(records, floor):
+    """
+    同一分區內以名稱 bigram 反向索引（只索引最稀有的前幾個 bigram）找出候選配對，
+    並先排除名稱相似度低於 floor 的配對
+    """
+    frequency = Counter(gram for record in records for gram in record.name_grams)
+
+    postings = defaultdict(list)
+    pairs = set()
+    for record in records:
+        grams = sorted(record.name_grams, key=lambda gram: (frequency[gram], gram))
+        matched = set()
+        for gram in grams[:prefix_length(len(grams), floor)]:
+            posting = postings[gram]
+            if len(posting) <= MAX_POSTING:
+                matched.update(posting)
+            posting.append(record)
+        pairs.update(
+            (other.id, record.id) for other in matched
+            if dice(other.name_grams, record.name_grams) >= floor
+        )
+    return pairs
+
+
+def load_records(db, Clinic, region=None):
+    """依 id 分批讀取比對所需欄位"""
+    columns = (Clinic.id, Clinic.region, Clinic.district, Clinic.name, Clinic.address, Clinic.phone)
+    records = []
+    last_id = 0
+    while True:
+        query = select(*columns).where(Clinic.id > last_id).order_by(Clinic.id).limit(BATCH_SIZE)
+        if region:
+            query = query.where(Clinic.region == region)
+        rows = db.session.execute(query).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        records.extend(Record(*row) for row in rows)
+    return records
+
+
+def find_duplicates(db, Clinic, region=None, threshold=DEFAULT_THRESHOLD):
+    """
+    找出疑似重複的診所群組
+    回傳 [{'ids': [...], 'score': 群組內最高相似度}]，依相似度由高到低排序
+    """
+    records = load_records(db, Clinic, region)
+    by_id = {record.id: record for record in records}
+
+    blocks = defaultdict(list)
+    phones = defaultdict(list)
+    for record in records:
+        blocks[record.block].append(record)
+        if len(record.phone) >= 7:
+            phones[record.phone].append(record)
+
+    floor = name_floor(threshold)
+    candidates = set()
+    for members in blocks.values():
+        if len(members) > 1:
+            candidates |= block_candidates(members, floor)
+    for members in phones.values():
+        if 1 < len(members) <= MAX_PHONE_GROUP:
+            ids = sorted(record.id for record in members)
+            candidates.update((a, b) for i, a in enumerate(ids) for b in ids[i + 1:])
+
+    # 以 union-find 將相似的配對合併為群組
+    parent = {}
+
+    def find(x):
+        while parent.get(x, x) != x:
+            x = parent[x]
+        return x
+
+    best = {}
+    for a, b in candidates:
+        score = similarity(by_id[a], by_id[b])
+        if score < threshold:
+            continue
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+        best[a] = max(best.get(a, 0), score)
+        best[b] = max(best.get(b, 0), score)
+
+    groups = defaultdict(list)
+    for clinic_id in best:
+        groups[find(clinic_id)].append(clinic_id)
+
+    result = [
+        {'ids': sorted(ids), 'score': round(max(best[i] for i in ids), 3)}
+        for ids in groups.values()
+    ]
+    result.sort(key=lambda group: (-group['score'], group['ids'][0]))
+    return result
+
+
+def merge_clinics(db, keep, others, fields):
+    """
+    將 others 合併到 keep 後刪除 others
+    - 空白欄位由其他資料補上
+    - 科別、媒體項目取聯集
+    - 健康醫購、百位任一為「是」即為「是」
+    - 備註以換行串接（去除重複）
+    """
+    for other in others:
+        for field in fields:
+            mine = getattr(keep, field)
+            theirs = getattr(other, field)
+            if not theirs:
+                continue
+            if field in ('specialties', 'media_items'):
+                merged = split_tags(mine) + [t for t in split_tags(theirs) if t not in split_tags(mine)]
+                setattr(keep, field, ','.join(merged))
+            elif field in ('health_mall', 'hundred_position'):
+                if theirs == '是':
+                    setattr(keep, field, '是')
+            elif field == 'note':
+                if not mine:
+                    setattr(keep, field, theirs)
+                elif theirs not in mine.split('\n'):
+                    setattr(keep, field, mine + '\n' + theirs)
+            elif not mine:
+                setattr(keep, field, theirs)
+        db.session.delete(other)
+
+    return keep
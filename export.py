@@ -1,75 +1,160 @@
-from flask import send_file
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from datetime import datetime
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+from openpyxl.utils import get_column_letter
+import csv
 import io
+import json
+import os
+import tempfile
 
-def export_clinics(clinics):
-    """匯出診所資料到 Excel"""
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "診所清單"
-    
-    # 設定欄位標題（按照你要的順序）
-    headers = ['縣市', '區域', '診所名稱', '科別', '地址', '電話', '負責人']
-    
-    # 寫入標題列（第1行）
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_num)
-        cell.value = header
-        cell.font = Font(bold=True, size=12, color="FFFFFF")
-        cell.fill = PatternFill(start_color="667EEA", end_color="667EEA", fill_type="solid")
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-        cell.border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-    
-    # 寫入資料（從第2行開始）
-    for row_num, clinic in enumerate(clinics, 2):
-        row_data = [
-            clinic.region or '',
-            clinic.district or '',
-            clinic.name or '',
-            clinic.specialties or '',
-            clinic.address or '',
-            clinic.phone or '',
-            clinic.contact_person or ''
-        ]
-        
-        for col_num, value in enumerate(row_data, 1):
-            cell = ws.cell(row=row_num, column=col_num)
-            cell.value = value
-            cell.alignment = Alignment(horizontal='left', vertical='center', wrap_text=True)
-            cell.border = Border(
-                left=Side(style='thin'),
-                right=Side(style='thin'),
-                top=Side(style='thin'),
-                bottom=Side(style='thin')
-            )
-    
-    # 調整欄寬
-    column_widths = {
-        'A': 12,  # 縣市
-        'B': 12,  # 區域
-        'C': 25,  # 診所名稱
-        'D': 20,  # 科別
-        'E': 35,  # 地址
-        'F': 15,  # 電話
-        'G': 12   # 負責人
-    }
-    
-    for col, width in column_widths.items():
-        ws.column_dimensions[col].width = width
-    
-    # 設定行高
+# 匯出欄位（按照你要的順序）：(標題, 欄位, 欄寬)
+EXPORT_COLUMNS = [
+    ('縣市', 'region', 12),
+    ('區域', 'district', 12),
+    ('診所名稱', 'name', 25),
+    ('科別', 'specialties', 20),
+    ('地址', 'address', 35),
+    ('電話', 'phone', 15),
+    ('負責人', 'contact_person', 12),
+]
+
+EXPORT_FIELDS = [field for _, field, _ in EXPORT_COLUMNS]
+
+# 串流回應每次送出的位元組數
+CHUNK_SIZE = 64 * 1024
+
+
+def make_styles():
+    """建立共用的具名樣式（整份檔案只建立一次，不再每個儲存格各自產生樣式物件）"""
+    thin = Side(style='thin')
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+
+    header = NamedStyle(name='clinic_header')
+    header.font = Font(bold=True, size=12, color="FFFFFF")
+    header.fill = PatternFill(start_color="667EEA", end_color="667EEA", fill_type="solid")
+    header.alignment = Alignment(horizontal='center', vertical='center')
+    header.border = border
+
+    body = NamedStyle(name='clinic_body')
+    body.alignment = Alignment(horizontal='left', vertical='center', wrap_text=True)
+    body.border = border
+
+    return header, body
+
+
+def row_values(clinic):
+    """取出一筆診所的匯出欄位值"""
+    return [getattr(clinic, field) or '' for field in EXPORT_FIELDS]
+
+
+def write_xlsx(clinics, fileobj):
+    """以 write-only 模式寫出 Excel，資料列逐筆寫入暫存檔，記憶體用量不隨筆數增加"""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("診所清單")
+
+    header_style, body_style = make_styles()
+    wb.add_named_style(header_style)
+    wb.add_named_style(body_style)
+
+    # 調整欄寬與標題列高（write-only 模式須在寫入資料前設定）
+    for col_num, (_, _, width) in enumerate(EXPORT_COLUMNS, 1):
+        ws.column_dimensions[get_column_letter(col_num)].width = width
     ws.row_dimensions[1].height = 25
-    
-    # 儲存到記憶體
+
+    def styled_row(values, style):
+        cells = []
+        for value in values:
+            cell = WriteOnlyCell(ws, value=value)
+            cell.style = style
+            cells.append(cell)
+        return cells
+
+    # 寫入標題列與資料
+    ws.append(styled_row([header for header, _, _ in EXPORT_COLUMNS], header_style.name))
+    for clinic in clinics:
+        ws.append(styled_row(row_values(clinic), body_style.name))
+
+    wb.save(fileobj)
+
+
+def export_clinics(clinics):
+    """匯出診所資料到 Excel（回傳記憶體中的檔案）"""
     output = io.BytesIO()
-    wb.save(output)
+    write_xlsx(clinics, output)
     output.seek(0)
-    
+
     return output
+
+
+def iter_xlsx(clinics):
+    """
+    串流輸出 Excel：先以 write-only 模式寫到暫存檔，再分段讀出
+    xlsx 為 zip 格式，須寫完才能產生目錄，因此第一段資料在寫檔完成後才送出
+    """
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        write_xlsx(clinics, path)
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+def iter_csv(clinics):
+    """串流輸出 CSV（含 BOM 讓 Excel 正確辨識 UTF-8 中文）"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow([header for header, _, _ in EXPORT_COLUMNS])
+
+    for clinic in clinics:
+        writer.writerow(row_values(clinic))
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue().encode('utf-8')
+
+
+def iter_jsonl(clinics):
+    """串流輸出 JSON Lines（每行一筆診所）"""
+    lines = []
+    size = 0
+    for clinic in clinics:
+        line = json.dumps(dict(zip(EXPORT_FIELDS, row_values(clinic))), ensure_ascii=False) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield ''.join(lines).encode('utf-8')
+            lines = []
+            size = 0
+
+    if lines:
+        yield ''.join(lines).encode('utf-8')
+
+
+def write_export(rows, path, export_format):
+    """將匯出內容寫入檔案（背景匯出工作使用）"""
+    if export_format == 'xlsx':
+        write_xlsx(rows, path)
+        return
+
+    generator = EXPORT_FORMATS[export_format][0]
+    with open(path, 'wb') as f:
+        for chunk in generator(rows):
+            f.write(chunk)
+
+
+# 匯出格式：(產生器, MIME 類型)
+EXPORT_FORMATS = {
+    'xlsx': (iter_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv': (iter_csv, 'text/csv; charset=utf-8'),
+    'jsonl': (iter_jsonl, 'application/x-ndjson; charset=utf-8'),
+}
@@ -0,0 +1,96 @@
+"""
+篩選條件的分面計數（縣市、區域、科別、媒體項目、健康醫購）
+- 所有分面在同一個 SQL 陳述式（UNION ALL）中計算，一次往返；
+  科別 / 媒體項目由有索引的關聯表分組，縣市 / 區域 / 健康醫購走 clinic 表索引，不載入診所資料
+- 每個分面套用「其他」篩選條件、不套用自己的條件（選了臺北市後，縣市選單仍顯示其他縣市的筆數）；
+  區域與健康醫購套用全部條件
+"""
+from sqlalchemy import func, literal, select, union_all
+from pagination import PaginationError
+import tags
+
+# 分面 -> 計數時排除的篩選參數（None 表示套用全部條件）
+FACETS = {
+    'region': 'region',
+    'district': None,
+    'specialty': 'specialty',
+    'media_item': 'media_item',
+    'health_mall': None,
+}
+
+
+def parse_facets(value):
+    """解析 facets 參數（逗號分隔），未指定時回傳全部分面"""
+    if not value:
+        return list(FACETS)
+    names = []
+    for name in value.split(','):
+        name = name.strip()
+        if name and name not in names:
+            if name not in FACETS:
+                raise PaginationError(f'不支援的分面: {name}')
+            names.append(name)
+    return names
+
+
+def facet_select(Clinic, name, query):
+    """
+    單一分面的分組查詢，欄位統一為 (分面, 值, 縣市, 筆數)
+    query 為篩選後的 Clinic 查詢（沒有條件時為 None）；clinic 表的分面直接沿用其條件，
+    科別 / 媒體項目以 id 子查詢限制關聯表
+    """
+    if name in ('specialty', 'media_item'):
+        # 先在關聯表以 tag id 分組（走 (tag_id, clinic_id) 索引），再對應名稱
+        field = 'specialties' if name == 'specialty' else 'media_items'
+        model, link, clinic_column, tag_column = tags.link_columns(Clinic, field)
+        counts = select(tag_column.label('tag_id'), func.count().label('count')).group_by(tag_column)
+        if query is not None:
+            counts = counts.where(clinic_column.in_(query.with_entities(Clinic.id).order_by(None)))
+        counts = counts.subquery()
+        return select(literal(name), model.name, literal(None), counts.c.count).join(model, model.id == counts.c.tag_id)
+
+    if name == 'total':
+        columns, group = (literal(None), literal(None)), ()
+    elif name == 'region':
+        columns, group = (Clinic.region, literal(None)), (Clinic.region,)
+    elif name == 'district':
+        columns, group = (Clinic.district, Clinic.region), (Clinic.region, Clinic.district)
+    else:
+        # 未設定視為「否」（於結果合併，直接分組才能使用索引）
+        columns, group = (Clinic.health_mall, literal(None)), (Clinic.health_mall,)
+    columns = (literal(name),) + columns + (func.count(Clinic.id),)
+    if query is None:
+        return select(*columns).group_by(*group)
+    return query.with_entities(*columns).group_by(*group).order_by(None).statement
+
+
+def facet_counts(session, Clinic, names, filtered):
+    """
+    計算指定分面的筆數（連同符合全部條件的總筆數）
+    filtered(exclude) 回傳符合篩選條件（排除 exclude 參數）的 Clinic 查詢，沒有任何條件時回傳 None
+    回傳 ({分面: [{'value', 'count'（區域另含 'region'）}]}, 總筆數)，依筆數由多到少排序
+    """
+    result = {name: [] for name in names}
+    total = 0
+    queries = [facet_select(Clinic, 'total', filtered(None))]
+    queries += [facet_select(Clinic, name, filtered(FACETS[name])) for name in names]
+    counts = {name: {} for name in names}
+    for name, value, region, count in session.execute(union_all(*queries)):
+        if name == 'total':
+            total = count
+            continue
+        if name == 'health_mall':
+            value = value or '否'
+        if value is None or value == '' or not count:
+            continue
+        key = (region, value)
+        counts[name][key] = counts[name].get(key, 0) + count
+
+    for name, items in counts.items():
+        for (region, value), count in items.items():
+            item = {'value': value, 'count': count}
+            if name == 'district':
+                item['region'] = region
+            result[name].append(item)
+        result[name].sort(key=lambda item: (-item['count'], item.get('region') or '', item['value']))
+    return result, total
@@ -0,0 +1,404 @@
+"""
+地理編碼與附近診所查詢
+- Geocoder：(地址, 縣市, 區域) -> (緯度, 經度, 精確度 address / district / region)
+  預設 OfflineGeocoder 以內建的縣市 / 區域中心點離線查詢，可用 GEOCODE_TABLE 指定 JSON 檔補充地址 / 區域座標；其他實作以 GEOCODER=module:Class 指定
+- 查詢結果（含查無結果）存入 geocode_cache 表，同一地址只查詢一次
+- ORM 新增或修改地址時自動補上座標；匯入與既有資料以 locate_rows() / fill_missing() 批次處理
+- 空間索引：SQLite 使用 R*Tree 虛擬表 clinic_geo（由觸發器同步），其他資料庫以 (latitude, longitude) 索引做範圍查詢
+"""
+import importlib
+import json
+import math
+import os
+import re
+from datetime import datetime
+from sqlalchemy import Integer, bindparam, column, event, insert, inspect, select, text, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import DBAPIError
+
+# 附近查詢預設 / 最大半徑（公里）
+DEFAULT_RADIUS = 5
+MAX_RADIUS = 50
+
+# 未指定 limit 時回傳的筆數
+DEFAULT_LIMIT = 50
+
+# 支援 ON CONFLICT 的資料庫
+DIALECT_INSERTS = {
+    'sqlite': sqlite_insert,
+    'postgresql': postgresql_insert,
+}
+
+# 批次補座標時每批筆數
+BATCH_SIZE = 1000
+
+# 緯度 1 度的距離（公里）
+KM_PER_DEGREE = 111.32
+EARTH_RADIUS_KM = 6371.0088
+
+# 影響座標的欄位
+GEO_FIELDS = ('region', 'district', 'address')
+
+# 縣市中心點（縣市政府附近）
+REGION_CENTROIDS = {
+    '臺北市': (25.0375, 121.5637),
+    '新北市': (25.0120, 121.4657),
+    '桃園市': (24.9936, 121.3010),
+    '臺中市': (24.1477, 120.6736),
+    '臺南市': (22.9999, 120.2270),
+    '高雄市': (22.6273, 120.3014),
+    '基隆市': (25.1276, 121.7392),
+    '新竹市': (24.8138, 120.9675),
+    '嘉義市': (23.4801, 120.4491),
+    '新竹縣': (24.8387, 121.0177),
+    '苗栗縣': (24.5602, 120.8214),
+    '彰化縣': (24.0518, 120.5161),
+    '南投縣': (23.9610, 120.9719),
+    '雲林縣': (23.7092, 120.4313),
+    '嘉義縣': (23.4518, 120.2555),
+    '屏東縣': (22.5519, 120.5488),
+    '宜蘭縣': (24.7021, 121.7378),
+    '花蓮縣': (23.9872, 121.6015),
+    '臺東縣': (22.7583, 121.1444),
+    '澎湖縣': (23.5711, 119.5793),
+    '金門縣': (24.4321, 118.3171),
+    '連江縣': (26.1605, 119.9517),
+}
+
+# 區域中心點（僅內建臺北市，其他區域可由 GEOCODE_TABLE 補充）
+DISTRICT_CENTROIDS = {
+    ('臺北市', '中正區'): (25.0324, 121.5199),
+    ('臺北市', '大同區'): (25.0633, 121.5130),
+    ('臺北市', '中山區'): (25.0642, 121.5330),
+    ('臺北市', '松山區'): (25.0497, 121.5779),
+    ('臺北市', '大安區'): (25.0268, 121.5435),
+    ('臺北市', '萬華區'): (25.0285, 121.4980),
+    ('臺北市', '信義區'): (25.0330, 121.5654),
+    ('臺北市', '士林區'): (25.0928, 121.5246),
+    ('臺北市', '北投區'): (25.1321, 121.4987),
+    ('臺北市', '內湖區'): (25.0694, 121.5886),
+    ('臺北市', '南港區'): (25.0553, 121.6070),
+    ('臺北市', '文山區'): (24.9897, 121.5707),
+}
+
+# 由地址開頭解析縣市與區域（如「臺北市大安區…」）
+ADDRESS_PATTERN = re.compile(r'^(?P<region>\S{2}[縣市])(?P<district>\S{1,3}?[區鄉鎮市])?')
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS clinic_geo USING rtree(id, min_lat, max_lat, min_lng, max_lng)",
+    """CREATE TRIGGER IF NOT EXISTS clinic_geo_ai AFTER INSERT ON clinic
+        WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN
+        INSERT INTO clinic_geo VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS clinic_geo_ad AFTER DELETE ON clinic BEGIN
+        DELETE FROM clinic_geo WHERE id = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS clinic_geo_au AFTER UPDATE OF latitude, longitude ON clinic BEGIN
+        DELETE FROM clinic_geo WHERE id = old.id;
+        INSERT INTO clinic_geo SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude
+        WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL;
+    END""",
+]
+
+SQLITE_REBUILD = [
+    "DELETE FROM clinic_geo",
+    """INSERT INTO clinic_geo SELECT id, latitude, latitude, longitude, longitude FROM clinic
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL""",
+]
+
+# R*Tree 無法使用時的退路（PostgreSQL 等）
+BTREE_DDL = "CREATE INDEX IF NOT EXISTS ix_clinic_lat_lng ON clinic (latitude, longitude)"
+
+# 每個資料庫是否已建立 R*Tree 索引（以連線 URL 為 key）
+_rtree_ready = {}
+
+
+def normalize_region(value):
+    """縣市名稱統一為「臺」"""
+    return (value or '').strip().replace('台', '臺')
+
+
+class OfflineGeocoder:
+    """離線查表：地址 → 區域中心點 → 縣市中心點"""
+
+    def __init__(self, table_path=None):
+        self.addresses = {}
+        self.districts = dict(DISTRICT_CENTROIDS)
+        self.regions = dict(REGION_CENTROIDS)
+
+        table_path = table_path or os.environ.get('GEOCODE_TABLE')
+        if table_path:
+            self.load(table_path)
+
+    def load(self, path):
+        """
+        載入補充座標，JSON 格式：
+        {"addresses": {"地址": [緯度, 經度]}, "districts": {"縣市/區域": [...]}, "regions": {"縣市": [...]}}
+        """
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        for address, point in data.get('addresses', {}).items():
+            self.addresses[address.strip()] = tuple(point)
+        for key, point in data.get('districts', {}).items():
+            region, _, district = key.partition('/')
+            self.districts[(normalize_region(region), district.strip())] = tuple(point)
+        for region, point in data.get('regions', {}).items():
+            self.regions[normalize_region(region)] = tuple(point)
+
+    def geocode(self, address, region=None, district=None):
+        address = (address or '').strip()
+        if address in self.addresses:
+            return self.addresses[address] + ('address',)
+
+        match = ADDRESS_PATTERN.match(normalize_region(address))
+        region = normalize_region(region) or (match and match.group('region')) or ''
+        district = (district or '').strip() or (match and match.group('district')) or ''
+
+        if (region, district) in self.districts:
+            return self.districts[(region, district)] + ('district',)
+        if region in self.regions:
+            return self.regions[region] + ('region',)
+        return None
+
+
+# 可用名稱指定的地理編碼器
+GEOCODERS = {
+    'offline': OfflineGeocoder,
+}
+
+
+def load_geocoder(name=None):
+    """依名稱（GEOCODERS）或 module:Class 建立地理編碼器，預設讀取 GEOCODER 環境變數"""
+    name = name or os.environ.get('GEOCODER', 'offline')
+    if name in GEOCODERS:
+        return GEOCODERS[name]()
+    module_name, _, class_name = name.partition(':')
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+def cache_key(address, region, district):
+    """geocode_cache 的 key"""
+    return '|'.join([normalize_region(region), (district or '').strip(), (address or '').strip()])[:300]
+
+
+class Locator:
+    """快取優先的地理編碼（同一批次內重複地址只查詢一次）"""
+
+    def __init__(self, session, cache_table, geocoder):
+        self.session = session
+        self.cache_table = cache_table
+        self.geocoder = geocoder
+        self.known = {}
+
+    def locate_many(self, items):
+        """items 為 [(地址, 縣市, 區域)]，回傳 {cache key: (緯度, 經度) 或 (None, None)}"""
+        keys = {cache_key(*item): item for item in items}
+        found = {key: self.known[key] for key in keys if key in self.known}
+        pending = [key for key in keys if key not in found]
+        table = self.cache_table
+        with self.session.no_autoflush:
+            for start in range(0, len(pending), BATCH_SIZE):
+                chunk = pending[start:start + BATCH_SIZE]
+                for address, latitude, longitude in self.session.execute(
+                    select(table.c.address, table.c.latitude, table.c.longitude).where(table.c.address.in_(chunk))
+                ):
+                    found[address] = (latitude, longitude)
+
+            now = datetime.utcnow()
+            entries = []
+            for key, item in keys.items():
+                if key in found:
+                    continue
+                result = self.geocoder.geocode(*item)
+                latitude, longitude, accuracy = result if result else (None, None, None)
+                entries.append({
+                    'address': key, 'latitude': latitude, 'longitude': longitude,
+                    'accuracy': accuracy, 'created_at': now
+                })
+                found[key] = (latitude, longitude)
+            if entries:
+                self.session.execute(cache_insert(self.session, table), entries)
+
+        self.known.update(found)
+        return found
+
+
+def cache_insert(session, table):
+    """寫入快取（其他程序已寫入相同地址時略過）"""
+    dialect_insert = DIALECT_INSERTS.get(session.get_bind().dialect.name)
+    if dialect_insert:
+        return dialect_insert(table).on_conflict_do_nothing(index_elements=[table.c.address])
+    return insert(table)
+
+
+def locate_rows(locator, rows):
+    """替 dict 資料列補上 latitude / longitude（匯入用）"""
+    items = [(row.get('address'), row.get('region'), row.get('district')) for row in rows]
+    found = locator.locate_many(items)
+    for row, item in zip(rows, items):
+        row['latitude'], row['longitude'] = found[cache_key(*item)]
+
+
+def register(session, Clinic, cache_table, geocoder_factory=load_geocoder):
+    """ORM 新增診所或修改地址時自動補上座標（手動指定座標時不覆寫）"""
+    geocoders = []
+
+    @event.listens_for(session, 'before_flush')
+    def geocode_before_flush(sess, flush_context, instances):
+        clinics = []
+        for obj in list(sess.new) + list(sess.dirty):
+            if not isinstance(obj, Clinic):
+                continue
+            state = inspect(obj)
+            if state.attrs.latitude.history.has_changes() or state.attrs.longitude.history.has_changes():
+                continue
+            if state.pending or any(getattr(state.attrs, f).history.has_changes() for f in GEO_FIELDS):
+                clinics.append(obj)
+        if not clinics:
+            return
+
+        if not geocoders:
+            geocoders.append(geocoder_factory())
+        items = [(c.address, c.region, c.district) for c in clinics]
+        found = Locator(sess, cache_table, geocoders[0]).locate_many(items)
+        for clinic, item in zip(clinics, items):
+            clinic.latitude, clinic.longitude = found[cache_key(*item)]
+
+    return geocode_before_flush
+
+
+def fill_missing(session, Clinic, cache_table, geocoder, refresh=False, batch_size=BATCH_SIZE, log=None):
+    """批次補上沒有座標的診所（refresh=True 時全部重新計算），回傳 (有座標, 查無結果) 筆數"""
+    located = missed = 0
+    last_id = 0
+    locator = Locator(session, cache_table, geocoder)
+    while True:
+        query = select(Clinic.id, Clinic.address, Clinic.region, Clinic.district).where(
+            Clinic.id > last_id
+        ).order_by(Clinic.id).limit(batch_size)
+        if not refresh:
+            query = query.where(Clinic.latitude.is_(None))
+        rows = [dict(row._mapping) for row in session.execute(query)]
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+
+        locate_rows(locator, rows)
+        values = [
+            {'clinic_id': row['id'], 'lat': row['latitude'], 'lng': row['longitude']}
+            for row in rows if refresh or row['latitude'] is not None
+        ]
+        if values:
+            # 只更新座標，不變動 updated_at
+            table = Clinic.__table__
+            session.execute(
+                update(table).where(table.c.id == bindparam('clinic_id')).values(
+                    latitude=bindparam('lat'), longitude=bindparam('lng'), updated_at=table.c.updated_at
+                ),
+                values
+            )
+        session.commit()
+
+        hits = sum(1 for row in rows if row['latitude'] is not None)
+        located += hits
+        missed += len(rows) - hits
+        if log:
+            log(f'已處理至 id {last_id}（有座標 {located}、查無結果 {missed}）')
+    return located, missed
+
+
+def install(connection):
+    """建立空間索引（可重複執行），並以既有座標重建 R*Tree，回傳是否使用 R*Tree"""
+    connection.exec_driver_sql(BTREE_DDL)
+    if connection.dialect.name != 'sqlite':
+        return False
+
+    # 未編譯 R*Tree 模組的 SQLite 只使用 B-tree 索引
+    options = connection.exec_driver_sql('PRAGMA compile_options').scalars().all()
+    if 'ENABLE_RTREE' not in options:
+        return False
+    for statement in SQLITE_DDL + SQLITE_REBUILD:
+        connection.exec_driver_sql(statement)
+
+    _rtree_ready[str(connection.engine.url)] = True
+    return True
+
+
+def register_index(Clinic):
+    """db.create_all() 建立 clinic 表後自動建立空間索引"""
+
+    @event.listens_for(Clinic.__table__, 'after_create')
+    def create_geo_index(target, connection, **kw):
+        install(connection)
+
+    @event.listens_for(Clinic.__table__, 'before_drop')
+    def drop_geo_index(target, connection, **kw):
+        if connection.dialect.name == 'sqlite':
+            connection.exec_driver_sql("DROP TABLE IF EXISTS clinic_geo")
+        _rtree_ready.pop(str(connection.engine.url), None)
+
+
+def rtree_ready(session):
+    """檢查目前資料庫是否已建立 R*Tree 索引"""
+    engine = session.get_bind()
+    key = str(engine.url)
+    if key not in _rtree_ready:
+        ready = False
+        if engine.dialect.name == 'sqlite':
+            try:
+                ready = session.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'clinic_geo'"
+                )).first() is not None
+            except DBAPIError:
+                ready = False
+        _rtree_ready[key] = ready
+    return _rtree_ready[key]
+
+
+def bounding_box(latitude, longitude, radius):
+    """半徑 radius 公里的外接矩形 (最小緯度, 最大緯度, 最小經度, 最大經度)"""
+    delta_lat = radius / KM_PER_DEGREE
+    cos_lat = max(math.cos(math.radians(latitude)), 0.01)
+    delta_lng = min(radius / (KM_PER_DEGREE * cos_lat), 180)
+    return latitude - delta_lat, latitude + delta_lat, longitude - delta_lng, longitude + delta_lng
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    """兩點的大圓距離（公里）"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def nearby(query, session, Clinic, latitude, longitude, radius):
+    """
+    以外接矩形走空間索引取出候選，再計算實際距離
+    query 為已套用其他篩選條件的診所查詢，回傳 [(距離, 診所 id)]，由近到遠排序
+    """
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius)
+    query = query.with_entities(Clinic.id, Clinic.latitude, Clinic.longitude)
+
+    if rtree_ready(session):
+        box = text(
+            "SELECT id FROM clinic_geo WHERE max_lat >= :min_lat AND min_lat <= :max_lat"
+            " AND max_lng >= :min_lng AND min_lng <= :max_lng"
+        ).bindparams(
+            min_lat=min_lat, max_lat=max_lat, min_lng=min_lng, max_lng=max_lng
+        ).columns(column('id', Integer)).subquery('geo')
+        query = query.join(box, box.c.id == Clinic.id)
+    else:
+        query = query.filter(
+            Clinic.latitude.between(min_lat, max_lat),
+            Clinic.longitude.between(min_lng, max_lng)
+        )
+
+    results = []
+    for clinic_id, clinic_lat, clinic_lng in query:
+        if clinic_lat is None or clinic_lng is None:
+            continue
+        distance = distance_km(latitude, longitude, clinic_lat, clinic_lng)
+        if distance <= radius:
+            results.append((distance, clinic_id))
+    results.sort()
+    return results
@@ -1,71 +1,231 @@
 from openpyxl import load_workbook
-import os
+from datetime import datetime
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+import stats
+import tags
+
+# 標題列與對應欄位
+EXPECTED_HEADERS = ['縣市', '區域', '診所名稱', '科別', '地址', '電話', '負責人']
+IMPORT_FIELDS = ['region', 'district', 'name', 'specialties', 'address', 'phone', 'contact_person']
+
+# 由地理編碼填入的欄位（locate 未提供時不寫入）
+GEO_FIELDS = ['latitude', 'longitude']
+
+# 每批寫入並提交的筆數
+BATCH_SIZE = 500
+
+# 匯入模式：insert 一律新增；upsert 依鍵值比對，已存在則更新
+IMPORT_MODES = ('insert', 'upsert')
+
+# upsert 比對鍵值
+UPSERT_KEYS = {
+    'name_address': ('name', 'address'),
+    'phone': ('phone',),
+}
+
+# 支援 ON CONFLICT 的資料庫
+DIALECT_INSERTS = {
+    'sqlite': sqlite_insert,
+    'postgresql': postgresql_insert,
+}
+
+
+def clean_value(value):
+    """儲存格值轉成字串（數字格式的電話等），空白視為 None"""
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    value = str(value).strip()
+    return value or None
+
+
+def match_key(values, key_fields):
+    """upsert 比對用的鍵值；鍵值欄位皆為空時回傳 None（視為新資料）"""
+    key = tuple(values.get(f) or '' for f in key_fields)
+    return key if any(key) else None
+
+
+def find_existing(db, Clinic, batch, key_fields):
+    """查詢批次中已存在的診所，回傳 {鍵值: id}"""
+    first = getattr(Clinic, key_fields[0])
+    candidates = {values[key_fields[0]] for values in batch if values.get(key_fields[0])}
+    if not candidates:
+        return {}
+
+    columns = [func.coalesce(getattr(Clinic, f), '') for f in key_fields]
+    rows = db.session.execute(
+        select(Clinic.id, *columns).where(first.in_(candidates)).order_by(Clinic.id)
+    ).all()
+
+    existing = {}
+    for row in rows:
+        existing.setdefault(tuple(row[1:]), row[0])
+    return existing
+
+
+def write_batch(db, Clinic, stat_table, batch, mode, key_fields, seen_keys, locate=None):
+    """寫入一批資料並提交，回傳 (新增數, 更新數, 略過數)"""
+    now = datetime.utcnow()
+    inserts = []
+    updates = []
+    skipped = 0
+
+    existing = find_existing(db, Clinic, batch, key_fields) if mode == 'upsert' else {}
+    for values in batch:
+        key = match_key(values, key_fields) if mode == 'upsert' else None
+        if key is not None:
+            # 同一檔案內重複的資料只處理第一筆
+            if key in seen_keys:
+                skipped += 1
+                continue
+            seen_keys.add(key)
+        if key is not None and key in existing:
+            updates.append(dict(values, id=existing[key], updated_at=now))
+        else:
+            inserts.append(dict(values, media_items='', created_at=now, updated_at=now))
+
+    if locate:
+        # 新增的資料一律補座標；更新的資料只在有地址時重新計算，否則保留原座標
+        located = inserts + [values for values in updates if values.get('address')]
+        for values in updates:
+            values.setdefault('latitude', None)
+            values.setdefault('longitude', None)
+        if located:
+            locate(located)
+
+    # 更新前的統計貢獻（新增的資料沒有）
+    connection = db.session.connection()
+    before = stats.snapshot(connection, Clinic, [values['id'] for values in updates])
+
+    changed_ids = []
+    if inserts:
+        # 以 executemany 批次新增，並取回新 id 以同步科別 / 媒體項目關聯表
+        changed_ids += db.session.scalars(
+            insert(Clinic).returning(Clinic.id, sort_by_parameter_order=True), inserts
+        ).all()
+
+    if updates:
+        table = Clinic.__table__
+        stmt = DIALECT_INSERTS[db.session.get_bind().dialect.name](table)
+        # 空白儲存格保留資料庫中的原值
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.id],
+            set_=dict(
+                {f: func.coalesce(stmt.excluded[f], table.c[f]) for f in IMPORT_FIELDS + GEO_FIELDS},
+                updated_at=stmt.excluded.updated_at
+            )
+        )
+        db.session.execute(stmt, updates)
+        changed_ids += [values['id'] for values in updates]
+
+    tags.rebuild_tags(db.session, Clinic, changed_ids)
+    stats.apply_changes(connection, Clinic, stat_table, before, changed_ids)
+    db.session.commit()
+
+    return len(inserts), len(updates), skipped
+
+
+def iter_batches(rows, batch_size, invalid):
+    """逐列驗證並分批產生 (起始列號, 結束列號, 資料)，驗證失敗的列記錄在 invalid"""
+    batch = []
+    first_row = None
+    row_num = 1
+    for row_num, row in enumerate(rows, start=2):
+        row = tuple(row[:7]) + (None,) * (7 - len(row[:7]))
+
+        # 跳過空白列
+        if not any(row):
+            continue
+
+        values = dict(zip(IMPORT_FIELDS, (clean_value(v) for v in row)))
+
+        # 驗證必填欄位
+        if not values['name']:
+            invalid.append(f'第{row_num}列：診所名稱為必填')
+            continue
+
+        if not batch:
+            first_row = row_num
+        batch.append(values)
+
+        if len(batch) >= batch_size:
+            yield first_row, row_num, batch
+            batch = []
+
+    if batch:
+        yield first_row, row_num, batch
+
+
+def import_clinics(file_path, db, Clinic, stat_table, mode='insert', key='name_address', batch_size=BATCH_SIZE, progress=None,
+                   locate=None):
+    """
+    從 Excel 匯入診所資料
+    以唯讀模式逐列讀取，每 batch_size 筆批次寫入並提交一次
+    mode='upsert' 時依 key（name_address 或 phone）比對既有資料，已存在則更新
+    progress(已處理列數, 總列數) 於每批寫入後呼叫（背景工作回報進度用）
+    locate(資料列) 於寫入前替每批資料補上 latitude / longitude（地理編碼）
+    """
+    if mode not in IMPORT_MODES:
+        return {'success': False, 'error': f'不支援的匯入模式: {mode}'}
+    if key not in UPSERT_KEYS:
+        return {'success': False, 'error': f'不支援的比對欄位: {key}'}
+    if mode == 'upsert' and db.session.get_bind().dialect.name not in DIALECT_INSERTS:
+        return {'success': False, 'error': '此資料庫不支援更新模式'}
+
+    key_fields = UPSERT_KEYS[key]
+    inserted = updated = skipped = 0
+    invalid = []
+    errors = []
+    seen_keys = set()
+
+    try:
+        wb = load_workbook(file_path, read_only=True)
+    except Exception as e:
+        return {'success': False, 'error': str(e)}
 
-def import_clinics(file_path, db, Clinic):
-    """從 Excel 匯入診所資料"""
     try:
-        wb = load_workbook(file_path)
         ws = wb.active
-        
+        rows = ws.iter_rows(values_only=True)
+
         # 驗證標題列
-        expected_headers = ['縣市', '區域', '診所名稱', '科別', '地址', '電話', '負責人']
-        actual_headers = [cell.value for cell in ws[1]]
-        
-        if actual_headers[:7] != expected_headers:
+        actual_headers = list(next(rows, ()))[:7]
+        if actual_headers != EXPECTED_HEADERS:
             return {'success': False, 'error': '檔案格式錯誤：標題列不符合要求'}
-        
-        # 讀取資料
-        imported_count = 0
-        errors = []
-        
-        for row_num, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
+
+        # 唯讀模式的 max_row 取自檔案的 dimension 記錄，部分工具產生的檔案沒有
+        total = ws.max_row - 1 if ws.max_row else None
+
+        for first_row, last_row, batch in iter_batches(rows, batch_size, invalid):
             try:
-                # 跳過空白列
-                if not any(row[:7]):
-                    continue
-                
-                region = row[0]
-                district = row[1]
-                name = row[2]
-                specialties = row[3]
-                address = row[4]
-                phone = row[5]
-                contact_person = row[6]
-                
-                # 驗證必填欄位
-                if not name:
-                    errors.append(f'第{row_num}列：診所名稱為必填')
-                    continue
-                
-                # 建立診所資料
-                clinic = Clinic(
-                    region=region,
-                    district=district,
-                    name=name,
-                    specialties=specialties,
-                    address=address,
-                    phone=phone,
-                    contact_person=contact_person,
-                    media_items=''  # 匯入時預設為空，可後續編輯
-                )
-                
-                db.session.add(clinic)
-                imported_count += 1
-                
+                counts = write_batch(db, Clinic, stat_table, batch, mode, key_fields, seen_keys, locate)
             except Exception as e:
-                errors.append(f'第{row_num}列：{str(e)}')
-        
-        # 提交到資料庫
-        db.session.commit()
-        
-        result = {
-            'success': True,
-            'imported': imported_count,
-            'errors': errors
-        }
-        
-        return result
-        
+                db.session.rollback()
+                errors.append(f'第{first_row}-{last_row}列：{str(e)}')
+                skipped += len(batch)
+                continue
+            inserted += counts[0]
+            updated += counts[1]
+            skipped += counts[2]
+            if progress:
+                progress(last_row - 1, total)
+
     except Exception as e:
         db.session.rollback()
         return {'success': False, 'error': str(e)}
+    finally:
+        wb.close()
+
+    # 驗證失敗的列也計入略過
+    skipped += len(invalid)
+
+    return {
+        'success': True,
+        'imported': inserted + updated,
+        'inserted': inserted,
+        'updated': updated,
+        'skipped': skipped,
+        'errors': invalid + errors
+    }
@@ -1,9 +1,11 @@
-from app import app, db, Clinic
+from app import create_app
+from models import db, Clinic
+import migrations
 import os
 
 def init_database():
     """初始化資料庫並新增範例診所資料"""
-    with app.app_context():
+    with create_app().app_context():
         try:
             # 檢查是否已經有資料
             existing_count = Clinic.query.count()
@@ -14,7 +16,7 @@ def init_database():
                 return
             
             # 建立表格（如果不存在）
-            db.create_all()
+            migrations.upgrade(db, Clinic)
             print("✅ 資料表已建立")
             
             # 新增範例資料
@@ -0,0 +1,148 @@
+"""
+背景工作：匯入 / 匯出改在執行緒池中執行，請求立即回傳工作 id
+工作狀態與進度寫在資料庫的 job 表，任何 worker 收到輪詢請求都能回報
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOB_DIR = os.environ.get('JOB_DIR', os.path.join(tempfile.gettempdir(), 'clinic_jobs'))
+
+# 完成超過此時數的工作檔案會被清除
+JOB_RETENTION_HOURS = int(os.environ.get('JOB_RETENTION_HOURS', '24'))
+
+# 進度寫回資料庫的最短間隔（秒）
+PROGRESS_INTERVAL = 1.0
+
+
+def job_path(job_id, suffix):
+    """工作使用的檔案路徑"""
+    os.makedirs(JOB_DIR, exist_ok=True)
+    return os.path.join(JOB_DIR, f'{job_id}{suffix}')
+
+
+def job_to_dict(job):
+    """工作狀態序列化（含預估剩餘秒數）"""
+    eta = None
+    if job.status == 'running' and job.started_at and job.total and job.processed:
+        elapsed = (datetime.utcnow() - job.started_at).total_seconds()
+        eta = round(elapsed / job.processed * (job.total - job.processed), 1)
+
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'total': job.total,
+        'processed': job.processed or 0,
+        'eta_seconds': eta,
+        'result': json.loads(job.result) if job.result else None,
+        'error': job.error,
+        'download': job.status == 'done' and bool(job.file_path),
+        'created_at': job.created_at.strftime('%Y-%m-%d %H:%M:%S') if job.created_at else None,
+        'finished_at': job.finished_at.strftime('%Y-%m-%d %H:%M:%S') if job.finished_at else None
+    }
+
+
+class Progress:
+    """傳給工作函式的進度回報器，節流寫回資料庫"""
+
+    def __init__(self, db, job):
+        self.db = db
+        self.job = job
+        self.last_saved = 0
+
+    def __call__(self, processed, total=None, force=False):
+        self.job.processed = processed
+        if total is not None:
+            self.job.total = total
+        now = time.monotonic()
+        if force or now - self.last_saved >= PROGRESS_INTERVAL:
+            self.db.session.commit()
+            self.last_saved = now
+
+
+class JobRunner:
+    """行程內的工作執行器（執行緒池在第一次送出工作時才建立，避免 gunicorn fork 前產生執行緒）"""
+
+    def __init__(self, app, db, Job, workers=JOB_WORKERS):
+        self.app = app
+        self.db = db
+        self.Job = Job
+        self.workers = workers
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def submit(self, kind, func, *args, job_id=None, file_path=None, file_name=None, **kwargs):
+        """
+        建立工作並放入執行緒池，立即回傳工作 id
+        func 會收到 Progress 物件作為第一個參數，回傳值（dict）存為工作結果
+        """
+        self.cleanup()
+
+        job = self.Job(
+            id=job_id or uuid.uuid4().hex,
+            kind=kind,
+            status='pending',
+            processed=0,
+            file_path=file_path,
+            file_name=file_name
+        )
+        self.db.session.add(job)
+        self.db.session.commit()
+
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='clinic-job')
+        self.executor.submit(self.run, job.id, func, args, kwargs)
+
+        return job.id
+
+    def run(self, job_id, func, args, kwargs):
+        """在背景執行緒中執行工作"""
+        with self.app.app_context():
+            db = self.db
+            job = db.session.get(self.Job, job_id)
+            job.status = 'running'
+            job.started_at = datetime.utcnow()
+            db.session.commit()
+
+            progress = Progress(db, job)
+            try:
+                result = func(progress, *args, **kwargs)
+            except Exception as e:
+                db.session.rollback()
+                job = db.session.get(self.Job, job_id)
+                job.status = 'failed'
+                job.error = str(e)
+            else:
+                job = db.session.get(self.Job, job_id)
+                if isinstance(result, dict) and result.get('success') is False:
+                    job.status = 'failed'
+                    job.error = result.get('error')
+                else:
+                    job.status = 'done'
+                    if job.total is None:
+                        job.total = job.processed
+                    job.processed = job.total
+                job.result = json.dumps(result, ensure_ascii=False) if result is not None else None
+            finally:
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+                db.session.remove()
+
+    def cleanup(self):
+        """刪除過期的工作與檔案"""
+        cutoff = datetime.utcnow() - timedelta(hours=JOB_RETENTION_HOURS)
+        expired = self.Job.query.filter(self.Job.finished_at < cutoff).all()
+        for job in expired:
+            if job.file_path and os.path.exists(job.file_path):
+                os.remove(job.file_path)
+            self.db.session.delete(job)
+        if expired:
+            self.db.session.commit()
@@ -0,0 +1,180 @@
+"""
+管理指令
+  python3 manage.py migrate    套用資料庫遷移
+  python3 manage.py status     顯示遷移套用狀態
+  python3 manage.py explain    顯示主要查詢的執行計畫（確認是否使用索引）
+  python3 manage.py rebuild-stats  由診所資料重新計算統計表（修復不一致）
+  python3 manage.py geocode    補上沒有座標的診所（--refresh 全部重新計算）
+  python3 manage.py prune-changes  刪除超過保留天數的異動記錄（--days，預設 90 天）
+  python3 manage.py snapshot FILE  建立資料庫快照（SQLite 預設線上備份，--portable 輸出可跨資料庫的 zip 檔）
+  python3 manage.py restore FILE   由快照還原（取代目前所有診所資料）
+"""
+import argparse
+from sqlalchemy import func
+from api import filter_clinics
+from app import create_app
+from models import db, Clinic, ClinicChange, ClinicStat, DataVersion, GeocodeCache
+from pagination import order_clauses
+import cache
+import changelog
+import geo
+import migrations
+import snapshot
+import stats
+
+app = create_app()
+
+# 列表頁每頁筆數（與前端一致）
+PAGE_SIZE = 50
+
+
+def explain_queries():
+    """(說明, 查詢) 清單，涵蓋列表、篩選、排序與統計的主要查詢"""
+    def page(query, column=Clinic.id, descending=False):
+        return query.order_by(*order_clauses(column, Clinic.id, descending)).limit(PAGE_SIZE + 1)
+
+    region, _ = filter_clinics({'region': '臺北市'})
+    specialty, _ = filter_clinics({'specialty': '內科'})
+    search, _ = filter_clinics({'search': '小兒科診所'})
+
+    return [
+        ('列表（依 id）', page(Clinic.query)),
+        ('縣市篩選', page(region)),
+        ('縣市 + 區域篩選', page(Clinic.query.filter(Clinic.region == '臺北市', Clinic.district == '大安區'))),
+        ('依名稱排序', page(Clinic.query, Clinic.name)),
+        ('依更新時間排序（新到舊）', page(Clinic.query, Clinic.updated_at, descending=True)),
+        ('科別篩選', page(specialty)),
+        ('關鍵字搜尋', page(search)),
+        ('健康醫購筆數', db.session.query(func.count(Clinic.id)).filter(Clinic.health_mall == '是')),
+        ('各縣市筆數', db.session.query(Clinic.region, func.count(Clinic.id)).group_by(Clinic.region)),
+        ('附近診所（空間索引）', nearby_query()),
+        ('統計表（儀表板）', db.session.query(ClinicStat).filter(ClinicStat.kind.in_(['region', 'region_health_mall']))),
+    ]
+
+
+def nearby_query():
+    """臺北車站 5 公里內的候選查詢（與 geo.nearby 相同的索引條件）"""
+    min_lat, max_lat, min_lng, max_lng = geo.bounding_box(25.0478, 121.5170, geo.DEFAULT_RADIUS)
+    query = db.session.query(Clinic.id, Clinic.latitude, Clinic.longitude)
+    if geo.rtree_ready(db.session):
+        box = db.text(
+            f"SELECT id FROM clinic_geo WHERE max_lat >= {min_lat} AND min_lat <= {max_lat}"
+            f" AND max_lng >= {min_lng} AND min_lng <= {max_lng}"
+        ).columns(db.column('id', db.Integer)).subquery('geo')
+        return query.join(box, box.c.id == Clinic.id)
+    return query.filter(Clinic.latitude.between(min_lat, max_lat), Clinic.longitude.between(min_lng, max_lng))
+
+
+def explain(query):
+    """取得查詢的執行計畫（每列一行文字）"""
+    connection = db.session.connection()
+    compiled = query.statement.compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True})
+
+    if connection.dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}').all()
+        return [row[-1] for row in rows]
+    return [row[0] for row in connection.exec_driver_sql(f'EXPLAIN {compiled}').all()]
+
+
+def cmd_migrate(args):
+    with app.app_context():
+        applied = migrations.upgrade(db, Clinic)
+        if not applied:
+            print('資料庫已是最新版本')
+
+
+def cmd_status(args):
+    with app.app_context():
+        for version, name, applied_at in migrations.status(db):
+            mark = applied_at.strftime('%Y-%m-%d %H:%M:%S') if applied_at else '尚未套用'
+            print(f'{version:03d} {name:<24} {mark}')
+
+
+def cmd_explain(args):
+    with app.app_context():
+        for title, query in explain_queries():
+            print(f'== {title}')
+            if args.sql:
+                print(query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+            for line in explain(query):
+                print(f'   {line}')
+            print()
+
+
+def cmd_rebuild_stats(args):
+    with app.app_context():
+        with db.engine.begin() as connection:
+            fixed, removed = stats.rebuild(connection, Clinic, ClinicStat.__table__)
+        print(f'✓ 已重建統計表（修正 {fixed} 項、移除 {removed} 項）')
+
+
+def cmd_geocode(args):
+    with app.app_context():
+        located, missed = geo.fill_missing(
+            db.session, Clinic, GeocodeCache.__table__, geo.load_geocoder(args.geocoder),
+            refresh=args.refresh, log=print
+        )
+        print(f'✓ 地理編碼完成（有座標 {located} 筆、查無結果 {missed} 筆）')
+
+
+def cmd_prune_changes(args):
+    with app.app_context():
+        removed = changelog.prune(db.session, ClinicChange.__table__, args.days)
+        # 同步回應可能因此變成 410，遞增資料版本讓快取失效
+        cache.bump_version(db.session, DataVersion)
+        db.session.commit()
+        print(f'✓ 已刪除 {removed} 筆超過 {args.days} 天的異動記錄')
+
+
+def cmd_snapshot(args):
+    with app.app_context():
+        counts = snapshot.create(db, args.file, portable=args.portable)
+        print(f"  診所 {counts.get('clinic', 0)} 筆")
+
+
+def cmd_restore(args):
+    if not args.yes:
+        answer = input(f'將以 {args.file} 取代目前資料庫的所有診所資料，確定繼續？[y/N] ')
+        if answer.strip().lower() != 'y':
+            print('已取消')
+            return
+    with app.app_context():
+        try:
+            counts = snapshot.restore(db, Clinic, args.file)
+        except snapshot.SnapshotError as e:
+            raise SystemExit(f'✗ {e}')
+        print(f"  診所 {counts.get('clinic', 0)} 筆")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='診所管理系統管理指令')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('migrate', help='套用資料庫遷移').set_defaults(func=cmd_migrate)
+    commands.add_parser('status', help='顯示遷移套用狀態').set_defaults(func=cmd_status)
+    explain_parser = commands.add_parser('explain', help='顯示主要查詢的執行計畫')
+    explain_parser.add_argument('--sql', action='store_true', help='一併印出 SQL')
+    explain_parser.set_defaults(func=cmd_explain)
+    commands.add_parser('rebuild-stats', help='重新計算統計表').set_defaults(func=cmd_rebuild_stats)
+    geocode_parser = commands.add_parser('geocode', help='補上診所座標')
+    geocode_parser.add_argument('--refresh', action='store_true', help='重新計算所有診所的座標')
+    geocode_parser.add_argument('--geocoder', help='地理編碼器（offline 或 module:Class，預設讀取 GEOCODER）')
+    geocode_parser.set_defaults(func=cmd_geocode)
+    prune_parser = commands.add_parser('prune-changes', help='刪除過期的異動記錄')
+    prune_parser.add_argument('--days', type=int, default=changelog.RETENTION_DAYS, help='保留天數')
+    prune_parser.set_defaults(func=cmd_prune_changes)
+    snapshot_parser = commands.add_parser('snapshot', help='建立資料庫快照')
+    snapshot_parser.add_argument('file', help='快照檔路徑')
+    snapshot_parser.add_argument('--portable', action='store_true', help='輸出可還原到其他資料庫的 zip 檔（PostgreSQL 一律使用）')
+    snapshot_parser.set_defaults(func=cmd_snapshot)
+    restore_parser = commands.add_parser('restore', help='由快照還原資料庫')
+    restore_parser.add_argument('file', help='快照檔路徑（自動判斷格式）')
+    restore_parser.add_argument('--yes', action='store_true', help='不詢問確認')
+    restore_parser.set_defaults(func=cmd_restore)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
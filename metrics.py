@@ -0,0 +1,280 @@
+"""
+請求計量與效能分析
+- 每個端點（路由規則）的延遲、SQL 陳述式數量、資料庫時間與回應大小，以直方圖累計
+- SQL 計數由 SQLAlchemy 引擎事件記錄（涵蓋 WSGI 與 ASGI 非同步查詢），只計入目前請求
+- GET /metrics 以 Prometheus 文字格式輸出；串流回應（匯出）在傳送完畢後才記錄
+- 管理員可在任何請求加上 ?profile=1，回傳該次請求的 cProfile 分析（有安裝 pyinstrument 時改用 pyinstrument）
+- 超過 SLOW_REQUEST_SECONDS 的請求寫入警告日誌
+- 冷啟動時間（載入模組、建立應用程式、第一個請求完成）記錄為 app_startup_seconds
+"""
+import contextvars
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+from flask import Response, g, jsonify, request, session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    import pyinstrument
+except ImportError:  # pyinstrument 為選用套件
+    pyinstrument = None
+
+# 直方圖區間
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# 慢請求門檻（秒），0 表示不記錄
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS', '1'))
+
+# profile 輸出的函式數
+PROFILE_LIMIT = 40
+
+# 目前請求的 SQL 統計（contextvar：執行緒與 asyncio task 各自獨立）
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class Histogram:
+    """Prometheus 風格的累計直方圖（以 label 值區分）"""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        counts, total = self.series.get(labels, ([0] * len(self.buckets), [0, 0.0]))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        total[0] += 1
+        total[1] += value
+        self.series[labels] = (counts, total)
+
+    def render(self, label_names):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for labels, (counts, (count, total)) in sorted(self.series.items()):
+            base = format_labels(zip(label_names, labels))
+            for bound, value in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {value}')
+            lines.append(f'{self.name}_bucket{{{base},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{base}}} {total:.6f}')
+            lines.append(f'{self.name}_count{{{base}}} {count}')
+        return lines
+
+
+def format_labels(pairs):
+    """label 序列化（跳脫反斜線、引號與換行）"""
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{name}="{escape(value)}"' for name, value in pairs)
+
+
+class Registry:
+    """所有端點的計量（以 lock 保護，多執行緒共用）"""
+
+    LABELS = ('endpoint', 'method')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.requests = {}
+        self.duration = Histogram('http_request_duration_seconds', '請求處理時間（秒）', DURATION_BUCKETS)
+        self.statements = Histogram('http_request_sql_statements', '每個請求執行的 SQL 陳述式數', STATEMENT_BUCKETS)
+        self.db_time = Histogram('http_request_db_seconds', '每個請求的資料庫時間（秒）', DURATION_BUCKETS)
+        self.size = Histogram('http_response_size_bytes', '回應大小（位元組，壓縮後）', SIZE_BUCKETS)
+        self.startup = {}
+
+    def observe(self, endpoint, method, status, duration, statements, db_time, size):
+        labels = (endpoint, method)
+        with self.lock:
+            key = labels + (str(status),)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.duration.observe(labels, duration)
+            self.statements.observe(labels, statements)
+            self.db_time.observe(labels, db_time)
+            self.size.observe(labels, size)
+
+    def render(self):
+        with self.lock:
+            lines = [
+                '# HELP http_requests_total 請求數',
+                '# TYPE http_requests_total counter',
+            ]
+            for key, value in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{{{format_labels(zip(self.LABELS + ("status",), key))}}} {value}')
+            for histogram in (self.duration, self.statements, self.db_time, self.size):
+                lines.extend(histogram.render(self.LABELS))
+            lines += [
+                '# HELP process_uptime_seconds 程序啟動至今的秒數',
+                '# TYPE process_uptime_seconds gauge',
+                f'process_uptime_seconds {time.time() - self.started:.3f}',
+            ]
+            if self.startup:
+                lines += ['# HELP app_startup_seconds 冷啟動各階段的秒數', '# TYPE app_startup_seconds gauge']
+                for phase, seconds in sorted(self.startup.items()):
+                    lines.append(f'app_startup_seconds{{{format_labels([("phase", phase)])}}} {seconds:.6f}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def record_startup(phase, seconds):
+    """記錄冷啟動階段的秒數（只保留第一次，同一程序建立多個應用程式時不覆寫）"""
+    with registry.lock:
+        registry.startup.setdefault(phase, seconds)
+
+
+def first_request(started):
+    """第一個請求完成時，記錄自 started（perf_counter）起算的冷啟動時間"""
+    if 'first_request' not in registry.startup:
+        record_startup('first_request', time.perf_counter() - started)
+
+
+class RequestStats:
+    """單一請求的計時與 SQL 統計"""
+    __slots__ = ('started', 'statements', 'db_time')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_time = 0.0
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def begin():
+    """開始記錄目前請求，回傳 (統計, contextvar token)"""
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def finish(stats, token, endpoint, method, status, size, logger=None):
+    """結束記錄並累計到 registry（token 為 None 時直接清除目前請求）"""
+    if token is None:
+        _current.set(None)
+    else:
+        _current.reset(token)
+    duration = stats.elapsed()
+    registry.observe(endpoint, method, status, duration, stats.statements, stats.db_time, size)
+    if logger and SLOW_REQUEST_SECONDS and duration >= SLOW_REQUEST_SECONDS:
+        logger.warning(
+            '慢請求 %s %s：%.3f 秒，SQL %d 次 / %.3f 秒，%d 位元組',
+            method, endpoint, duration, stats.statements, stats.db_time, size
+        )
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def sql_started(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def sql_finished(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = conn.info.get('query_started')
+    if stats is None or not started:
+        return
+    stats.statements += 1
+    stats.db_time += time.perf_counter() - started.pop()
+
+
+def endpoint_label():
+    """以路由規則作為 endpoint（避免 id 等路徑參數造成大量 label）"""
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+def profile_text(profiler, response):
+    """profile 結果（純文字）"""
+    stats = g.request_stats
+    header = (
+        f'{request.method} {request.full_path}\n'
+        f'狀態 {response.status_code}，{stats.elapsed():.3f} 秒，'
+        f'SQL {stats.statements} 次 / {stats.db_time:.3f} 秒\n\n'
+    )
+    if pyinstrument is not None:
+        return header + profiler.output_text(unicode=True, color=False)
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(PROFILE_LIMIT)
+    return header + output.getvalue()
+
+
+def register(app, started=None):
+    """
+    在 Flask 應用程式掛上計量與 profile（需在 compression.register 之前呼叫，才能記錄壓縮後大小）
+    started 為程序開始載入的 perf_counter 時間，用於記錄第一個請求完成的冷啟動時間
+    """
+
+    @app.before_request
+    def metrics_before_request():
+        g.request_stats, g.request_token = begin()
+
+        if request.args.get('profile') == '1':
+            if session.get('role') != 'admin':
+                return jsonify({'error': '權限不足'}), 403
+            if pyinstrument is not None:
+                g.profiler = pyinstrument.Profiler()
+                g.profiler.start()
+            else:
+                g.profiler = cProfile.Profile()
+                g.profiler.enable()
+
+    @app.after_request
+    def metrics_after_request(response):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            if response.is_streamed:
+                # 串流回應（匯出）在 profile 期間全部產生完畢
+                for _ in response.response:
+                    pass
+            if pyinstrument is not None:
+                profiler.stop()
+            else:
+                profiler.disable()
+            response = Response(profile_text(profiler, response), mimetype='text/plain')
+
+        stats = g.pop('request_stats', None)
+        token = g.pop('request_token', None)
+        if stats is None:
+            return response
+
+        if started is not None:
+            first_request(started)
+
+        endpoint = endpoint_label()
+        method = request.method
+        logger = app.logger
+        if response.is_streamed:
+            # 串流回應在送完最後一段時才記錄時間與大小
+            response.response = counted_stream(response.response, stats, endpoint, method, response.status_code, logger)
+            _current.reset(token)
+        else:
+            size = response.content_length
+            if size is None:
+                size = response.calculate_content_length() or 0
+            finish(stats, token, endpoint, method, response.status_code, size, logger)
+        return response
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+def counted_stream(chunks, stats, endpoint, method, status, logger):
+    """包裝串流回應，計算傳送的位元組並在結束時記錄（串流期間的 SQL 也計入）"""
+    size = 0
+    _current.set(stats)
+    try:
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+    finally:
+        finish(stats, None, endpoint, method, status, size, logger)
@@ -0,0 +1,161 @@
+"""
+資料庫版本化遷移
+- 已套用的版本記錄在 schema_version 表，每個遷移只執行一次，且各自在獨立交易中完成
+- 每個遷移本身也可重複執行（檢查欄位 / 索引是否存在），舊資料庫沒有版本記錄時會安全地補齊
+- SQLite 與 PostgreSQL 共用同一套遷移；PostgreSQL 以 advisory lock 避免多個程序同時遷移
+"""
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, insert, select, text
+from sqlalchemy.orm import Session
+import changelog
+import geo
+import search
+import stats
+import tags
+
+# PostgreSQL advisory lock 的 key（任意固定整數）
+MIGRATION_LOCK_ID = 20260301
+
+schema_version = Table(
+    'schema_version', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('name', String(100), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+def create_tables(connection, db, Clinic):
+    """建立尚未存在的資料表（新資料庫會連同索引一起建立）"""
+    db.metadata.create_all(connection)
+
+
+def add_clinic_columns(connection, db, Clinic):
+    """補上舊版 clinic 表缺少的欄位"""
+    existing = {column['name'] for column in inspect(connection).get_columns('clinic')}
+    columns = [
+        ('health_mall', "VARCHAR(10) DEFAULT '否'"),
+        ('hundred_position', "VARCHAR(10) DEFAULT '否'"),
+        ('business_hours', 'VARCHAR(200)'),
+        ('note', 'TEXT'),
+    ]
+    for name, column_type in columns:
+        if name not in existing:
+            connection.exec_driver_sql(f'ALTER TABLE clinic ADD COLUMN {name} {column_type}')
+
+
+def backfill_tags(connection, db, Clinic):
+    """由逗號字串欄位回填科別 / 媒體項目關聯表"""
+    # session 加入遷移的交易，關閉時不會回滾
+    session = Session(bind=connection)
+    try:
+        tags.rebuild_tags(session, Clinic)
+        session.flush()
+    finally:
+        session.close()
+
+
+def install_search(connection, db, Clinic):
+    """建立全文搜尋索引（SQLite FTS5 / PostgreSQL pg_trgm）"""
+    search.install(connection)
+
+
+def create_clinic_indexes(connection, db, Clinic):
+    """建立 clinic 表的篩選 / 排序索引（定義於 Clinic.__table_args__）"""
+    for index in Clinic.__table__.indexes:
+        index.create(connection, checkfirst=True)
+
+
+def build_clinic_stats(connection, db, Clinic):
+    """建立並計算預先彙總的統計表"""
+    stat_table = db.metadata.tables['clinic_stat']
+    stat_table.create(connection, checkfirst=True)
+    stats.rebuild(connection, Clinic, stat_table)
+
+
+def add_geocoding(connection, db, Clinic):
+    """新增座標欄位、地理編碼快取與空間索引，並補上既有資料的座標"""
+    existing = {column['name'] for column in inspect(connection).get_columns('clinic')}
+    for name in ('latitude', 'longitude'):
+        if name not in existing:
+            connection.exec_driver_sql(f'ALTER TABLE clinic ADD COLUMN {name} FLOAT')
+    cache_table = db.metadata.tables['geocode_cache']
+    cache_table.create(connection, checkfirst=True)
+
+    session = Session(bind=connection)
+    try:
+        geo.fill_missing(session, Clinic, cache_table, geo.load_geocoder())
+    finally:
+        session.close()
+    geo.install(connection)
+
+
+def create_change_log(connection, db, Clinic):
+    """建立異動記錄表與觸發器（既有資料從此版本開始記錄，較早的同步請求需重新取得完整資料）"""
+    change_table = db.metadata.tables['clinic_change']
+    change_table.create(connection, checkfirst=True)
+    changelog.install(connection, Clinic, change_table)
+    changelog.mark_reset(connection, change_table)
+
+
+# (版本, 名稱, 函式)，只能往後新增，不可修改已發布的版本
+MIGRATIONS = [
+    (1, 'create_tables', create_tables),
+    (2, 'add_clinic_columns', add_clinic_columns),
+    (3, 'backfill_tags', backfill_tags),
+    (4, 'install_search', install_search),
+    (5, 'create_clinic_indexes', create_clinic_indexes),
+    (6, 'build_clinic_stats', build_clinic_stats),
+    (7, 'add_geocoding', add_geocoding),
+    (8, 'create_change_log', create_change_log),
+]
+
+
+def applied_versions(connection):
+    """已套用的版本"""
+    return set(connection.execute(select(schema_version.c.version)).scalars())
+
+
+def upgrade(db, Clinic, log=print):
+    """套用所有尚未執行的遷移，回傳本次套用的名稱"""
+    applied = []
+    with db.engine.connect() as connection:
+        postgres = connection.dialect.name == 'postgresql'
+        if postgres:
+            connection.execute(text('SELECT pg_advisory_lock(:id)'), {'id': MIGRATION_LOCK_ID})
+            connection.commit()
+
+        try:
+            schema_version.create(connection, checkfirst=True)
+            done = applied_versions(connection)
+            connection.commit()
+
+            for version, name, migrate in MIGRATIONS:
+                if version in done:
+                    continue
+                with connection.begin():
+                    migrate(connection, db, Clinic)
+                    connection.execute(insert(schema_version).values(
+                        version=version, name=name, applied_at=datetime.utcnow()
+                    ))
+                applied.append(name)
+                if log:
+                    log(f'✓ {version:03d} {name}')
+        finally:
+            if postgres:
+                connection.execute(text('SELECT pg_advisory_unlock(:id)'), {'id': MIGRATION_LOCK_ID})
+                connection.commit()
+
+    return applied
+
+
+def status(db):
+    """各遷移的套用狀態：[(版本, 名稱, 套用時間或 None)]"""
+    with db.engine.connect() as connection:
+        if not inspect(connection).has_table('schema_version'):
+            applied = {}
+        else:
+            applied = dict(connection.execute(
+                select(schema_version.c.version, schema_version.c.applied_at)
+            ).all())
+
+    return [(version, name, applied.get(version)) for version, name, _ in MIGRATIONS]
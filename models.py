@@ -0,0 +1,134 @@
+"""
+資料模型與資料庫事件
+- db 尚未綁定應用程式，由 app.create_app() 呼叫 db.init_app()；
+  初始化、遷移等腳本只需要模型時不必載入路由與匯入 / 匯出模組
+"""
+from datetime import datetime
+from flask_sqlalchemy import SQLAlchemy
+import cache
+import changelog
+import geo
+import replica
+import search as search_index
+import stats
+import tags
+
+# 讀取依請求選擇主資料庫或複本（見 replica.py）
+db = SQLAlchemy(session_options={'class_': replica.RoutingSession})
+
+# 科別 / 媒體項目與診所的多對多關聯表（另建 tag_id 開頭的索引供篩選使用）
+clinic_specialty = db.Table(
+    'clinic_specialty',
+    db.Column('clinic_id', db.Integer, db.ForeignKey('clinic.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('specialty_id', db.Integer, db.ForeignKey('specialty.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_clinic_specialty_specialty_id', 'specialty_id', 'clinic_id')
+)
+
+clinic_media_item = db.Table(
+    'clinic_media_item',
+    db.Column('clinic_id', db.Integer, db.ForeignKey('clinic.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('media_item_id', db.Integer, db.ForeignKey('media_item.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_clinic_media_item_media_item_id', 'media_item_id', 'clinic_id')
+)
+
+# 科別對照表
+class Specialty(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+
+# 媒體項目對照表
+class MediaItem(db.Model):
+    __tablename__ = 'media_item'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+
+# 診所資料模型
+class Clinic(db.Model):
+    # 篩選與排序用索引（排序索引帶 id，對應 keyset 分頁的 (欄位, id) 順序）
+    __table_args__ = (
+        db.Index('ix_clinic_region_district', 'region', 'district'),
+        db.Index('ix_clinic_name', 'name', 'id'),
+        db.Index('ix_clinic_updated_at', 'updated_at', 'id'),
+        db.Index('ix_clinic_health_mall', 'health_mall'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    region = db.Column(db.String(50))  # 縣市
+    district = db.Column(db.String(50))  # 區域
+    name = db.Column(db.String(200))  # 診所名稱
+    health_mall = db.Column(db.String(10), default='否')  # 健康醫購
+    hundred_position = db.Column(db.String(10), default='否')  # 百位
+    media_items = db.Column(db.String(500))  # 媒體項目
+    specialties = db.Column(db.String(500))  # 科別
+    address = db.Column(db.String(300))  # 地址
+    phone = db.Column(db.String(50))  # 電話
+    contact_person = db.Column(db.String(100))  # 負責人
+    business_hours = db.Column(db.String(200))  # 營業時間
+    note = db.Column(db.Text)  # 備註
+    latitude = db.Column(db.Float)  # 緯度（由 geo.py 地理編碼，空間索引見 geo.install）
+    longitude = db.Column(db.Float)  # 經度
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # 正規化後的科別 / 媒體項目（由 specialties、media_items 自動同步）
+    specialty_tags = db.relationship('Specialty', secondary=clinic_specialty)
+    media_tags = db.relationship('MediaItem', secondary=clinic_media_item)
+
+# 背景工作（匯入 / 匯出）
+class Job(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(20))  # import / export
+    status = db.Column(db.String(20), default='pending')  # pending / running / done / failed
+    total = db.Column(db.Integer)  # 總筆數
+    processed = db.Column(db.Integer, default=0)  # 已處理筆數
+    result = db.Column(db.Text)  # 結果（JSON）
+    error = db.Column(db.Text)
+    file_path = db.Column(db.String(500))  # 匯出檔案位置
+    file_name = db.Column(db.String(200))  # 下載檔名
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+# 資料版本（只有一列，任何診所資料寫入都會遞增，供 ETag 與讀取快取使用）
+class DataVersion(db.Model):
+    __tablename__ = 'data_version'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# 預先計算的統計（由 stats.py 增量維護，儀表板直接讀取）
+class ClinicStat(db.Model):
+    __tablename__ = 'clinic_stat'
+    kind = db.Column(db.String(30), primary_key=True)  # total / region / specialty / media_item ...
+    key = db.Column(db.String(100), primary_key=True)  # 縣市、科別或媒體項目名稱
+    value = db.Column(db.Integer, nullable=False, default=0)  # 診所數
+
+# 地理編碼快取（key 為正規化的 縣市|區域|地址，查無結果也會記錄）
+class GeocodeCache(db.Model):
+    __tablename__ = 'geocode_cache'
+    address = db.Column(db.String(300), primary_key=True)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    accuracy = db.Column(db.String(20))  # address / district / region
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# 診所異動記錄（只增不改，id 即同步版本號；由 changelog.py 的資料庫觸發器寫入）
+class ClinicChange(db.Model):
+    __tablename__ = 'clinic_change'
+    __table_args__ = (
+        db.Index('ix_clinic_change_action', 'action', 'id'),
+        {'sqlite_autoincrement': True},  # 刪除舊記錄後 id 也不重複使用
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    clinic_id = db.Column(db.Integer)  # 不設外鍵，刪除後仍保留記錄
+    action = db.Column(db.String(10), nullable=False)  # create / update / delete / reset
+    fields = db.Column(db.String(500))  # 更新時改變的欄位（逗號分隔）
+    changed_at = db.Column(db.DateTime, nullable=False)
+
+tags.register(db.session, Clinic)
+search_index.register(Clinic)
+changelog.register(Clinic, ClinicChange.__table__)
+geo.register_index(Clinic)
+geo.register(db.session, Clinic, GeocodeCache.__table__)
+cache.register(db.session, DataVersion)
+stats.register(db.session, Clinic, ClinicStat.__table__)
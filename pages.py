@@ -0,0 +1,44 @@
+"""
+頁面與登入（blueprint：pages）
+"""
+from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for
+
+pages = Blueprint('pages', __name__)
+
+# 登入路由
+@pages.route('/')
+def index():
+    if 'user' not in session:
+        return redirect(url_for('pages.login'))
+    return render_template('index.html')
+
+@pages.route('/analytics')
+def analytics():
+    if 'user' not in session:
+        return redirect(url_for('pages.login'))
+    return render_template('analytics.html')
+
+@pages.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        data = request.get_json()
+        username = data.get('username')
+        password = data.get('password')
+        
+        if username == 'admin' and password == 'Bcm13011579!@':
+            session['user'] = 'admin'
+            session['role'] = 'admin'
+            return jsonify({'success': True})
+        elif username == 'user' and password == 'Bcm13011579':
+            session['user'] = 'user'
+            session['role'] = 'user'
+            return jsonify({'success': True})
+        else:
+            return jsonify({'error': '帳號或密碼錯誤'}), 401
+    
+    return render_template('login.html')
+
+@pages.route('/logout')
+def logout():
+    session.clear()
+    return redirect(url_for('pages.login'))
@@ -0,0 +1,125 @@
+"""
+列表分頁工具：limit / cursor（keyset）分頁
+cursor 內容為「上一頁最後一筆的排序值與 id」，以 base64 編碼後交給前端
+另支援 limit / offset 依位置取頁（虛擬捲動的表格直接跳到任意位置時使用）
+"""
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+MAX_PAGE_SIZE = 1000
+
+
+class PaginationError(ValueError):
+    """分頁參數錯誤"""
+
+
+def parse_limit(value):
+    """解析 limit 參數，未提供時回傳 None（不分頁）"""
+    if value in (None, ''):
+        return None
+    try:
+        limit = int(value)
+    except ValueError:
+        raise PaginationError('limit 必須為整數')
+    if limit < 1:
+        raise PaginationError('limit 必須大於 0')
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def parse_offset(value):
+    """解析 offset 參數，未提供時回傳 None"""
+    if value in (None, ''):
+        return None
+    try:
+        offset = int(value)
+    except ValueError:
+        raise PaginationError('offset 必須為整數')
+    if offset < 0:
+        raise PaginationError('offset 不可為負數')
+    return offset
+
+
+def encode_cursor(value, row_id):
+    """將排序值與 id 編碼成 cursor 字串"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, row_id], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, column):
+    """解析 cursor 字串，回傳 (排序值, id)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, row_id = json.loads(base64.urlsafe_b64decode(padded).decode('utf-8'))
+        row_id = int(row_id)
+        if value is not None and column.type.python_type is datetime:
+            value = datetime.fromisoformat(value)
+    except (ValueError, TypeError, NotImplementedError):
+        raise PaginationError('cursor 格式錯誤')
+    return value, row_id
+
+
+def keyset_filter(column, id_column, value, row_id, descending):
+    """
+    產生「排在 cursor 之後」的條件
+    NULL 視為最大值：遞增時排最後、遞減時排最前（與 PostgreSQL 預設一致）
+    """
+    if column is id_column:
+        return id_column < row_id if descending else id_column > row_id
+
+    if descending:
+        if value is None:
+            return or_(and_(column.is_(None), id_column < row_id), column.isnot(None))
+        return or_(column < value, and_(column == value, id_column < row_id))
+
+    if value is None:
+        return and_(column.is_(None), id_column > row_id)
+    return or_(column > value, and_(column == value, id_column > row_id), column.is_(None))
+
+
+def order_clauses(column, id_column, descending):
+    """對應 keyset_filter 的排序方式"""
+    if column is id_column:
+        return [id_column.desc() if descending else id_column.asc()]
+    if descending:
+        return [column.desc().nulls_first(), id_column.desc()]
+    return [column.asc().nulls_last(), id_column.asc()]
+
+
+def paginate(query, column, id_column, limit, cursor=None, descending=False):
+    """
+    以 keyset 方式取得一頁資料
+    回傳 (資料列, 下一頁 cursor 或 None)
+    """
+    if cursor:
+        value, row_id = decode_cursor(cursor, column)
+        query = query.filter(keyset_filter(column, id_column, value, row_id, descending))
+
+    rows = query.order_by(*order_clauses(column, id_column, descending)).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, column.key), last.id)
+
+    return rows, next_cursor
+
+
+def iter_keyset(query, id_column, batch_size):
+    """
+    依 id 分批逐筆產生資料列，每批都是獨立的短查詢
+    不佔用長時間開啟的資料庫游標（背景工作與其他寫入交錯時使用）
+    """
+    last_id = None
+    while True:
+        batch_query = query if last_id is None else query.filter(id_column > last_id)
+        rows = batch_query.order_by(id_column).limit(batch_size).all()
+        for row in rows:
+            yield row
+        if len(rows) < batch_size:
+            break
+        last_id = rows[-1].id
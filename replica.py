@@ -0,0 +1,148 @@
+"""
+讀寫分離：讀取 API 可改由唯讀複本（read replica）處理
+- DATABASE_READ_URL 設定一或多個複本（逗號分隔），未設定時全部使用主資料庫
+- 只有標記 @replica.reads 的 GET 路由使用複本（列表、統計、分析、匯出等）；
+  寫入、flush 與未標記的路由一律使用主資料庫
+- read-your-writes：請求提交寫入後，回應設定 cookie 記錄寫入後的資料版本；
+  之後的讀取若複本的資料版本尚未追上，改由主資料庫回應，不會看到自己寫入前的舊資料
+- 本機測試可用兩個 SQLite 檔：DATABASE_READ_URL=sqlite:///replica.db（複本內容需自行同步，如複製檔案）
+"""
+import os
+import random
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, select
+import db_config
+
+# 記錄寫入後資料版本的 cookie
+VERSION_COOKIE = 'db_version'
+
+# cookie 有效時間（秒），超過後視為複本已追上
+COOKIE_MAX_AGE = int(os.environ.get('REPLICA_COOKIE_MAX_AGE', '300'))
+
+
+def parse_urls(value):
+    """解析 DATABASE_READ_URL（逗號分隔）"""
+    return [db_config.normalize_url(url.strip()) for url in (value or '').split(',') if url.strip()]
+
+
+def create_engines(urls):
+    """建立複本引擎（連線設定同主資料庫）"""
+    engines = []
+    for url in urls:
+        engine = create_engine(url, **db_config.engine_options(url))
+        db_config.configure(engine)
+        engines.append(engine)
+    return engines
+
+
+def current_replica():
+    """目前請求使用的複本引擎（不使用複本時為 None）"""
+    if not has_request_context():
+        return None
+    return g.get('db_replica')
+
+
+class RoutingSession(Session):
+    """讀取時改用目前請求選定的複本；flush 與 insert / update / delete 一律使用主資料庫"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not getattr(clause, 'is_dml', False):
+            replica = current_replica()
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def reads(view):
+    """標記可由複本處理的讀取路由"""
+    view.use_replica = True
+    return view
+
+
+def required_version(cookies):
+    """cookie 中記錄的最低資料版本（沒有時為 0）"""
+    try:
+        return int(cookies.get(VERSION_COOKIE, 0))
+    except ValueError:
+        return 0
+
+
+def replica_version(engine, DataVersion):
+    """複本目前的資料版本"""
+    with engine.connect() as connection:
+        return connection.execute(select(DataVersion.version).where(DataVersion.id == 1)).scalar() or 0
+
+
+def health(engines, DataVersion):
+    """各複本的連線狀態、資料版本與連線池狀態（/api/health）"""
+    result = []
+    for engine in engines:
+        status = {'database': engine.dialect.name, 'pool': db_config.pool_status(engine)}
+        try:
+            status['version'] = replica_version(engine, DataVersion)
+            status['status'] = 'ok'
+        except Exception as e:
+            status['status'] = 'error'
+            status['error'] = str(e)
+        result.append(status)
+    return result
+
+
+def choose(engines, required, version_of):
+    """
+    隨機選擇一個複本；複本的資料版本低於 required 時改試其他複本，都落後時回傳 None（使用主資料庫）
+    version_of(engine) 回傳該複本的資料版本
+    """
+    candidates = list(engines)
+    random.shuffle(candidates)
+    for engine in candidates:
+        if not required:
+            return engine
+        try:
+            if version_of(engine) >= required:
+                return engine
+        except Exception:
+            continue
+    return None
+
+
+def register(app, db, DataVersion, engines):
+    """依路由標記選擇複本，並在寫入的請求回應中設定 read-your-writes cookie"""
+    if not engines:
+        return
+
+    @app.before_request
+    def route_to_replica():
+        view = app.view_functions.get(request.endpoint)
+        if request.method not in ('GET', 'HEAD') or not getattr(view, 'use_replica', False):
+            return
+        required = required_version(request.cookies)
+        g.db_replica = choose(engines, required, lambda engine: replica_version(engine, DataVersion))
+
+    @event.listens_for(db.session, 'after_flush')
+    def mark_flush_write(sess, flush_context):
+        sess.info['db_wrote'] = True
+
+    @event.listens_for(db.session, 'do_orm_execute')
+    def mark_bulk_write(orm_execute_state):
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            orm_execute_state.session.info['db_wrote'] = True
+
+    @event.listens_for(db.session, 'after_commit')
+    def remember_write(sess):
+        if sess.info.pop('db_wrote', False) and has_request_context():
+            g.db_written = True
+
+    @event.listens_for(db.session, 'after_rollback')
+    def forget_write(sess):
+        sess.info.pop('db_wrote', None)
+
+    @app.after_request
+    def set_version_cookie(response):
+        if g.pop('db_written', False):
+            version = db.session.execute(
+                select(DataVersion.version).where(DataVersion.id == 1)
+            ).scalar() or 0
+            response.set_cookie(VERSION_COOKIE, str(version), max_age=COOKIE_MAX_AGE, httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,155 @@
+"""
+診所全文搜尋（診所名稱、地址、負責人）
+- SQLite：FTS5 trigram 外部內容表 clinic_fts，由資料庫觸發器在新增、更新、刪除時同步
+- PostgreSQL：pg_trgm GIN 索引，ILIKE 直接走索引，以 similarity() 排序
+關鍵字少於 3 個字（trigram 無法索引）或索引尚未建立時，退回 LIKE 查詢
+"""
+import sqlite3
+from sqlalchemy import Float, Integer, column, event, func, or_, text
+from sqlalchemy.exc import DBAPIError
+
+SEARCH_FIELDS = ('name', 'address', 'contact_person')
+MIN_TRIGRAM_LENGTH = 3
+
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS clinic_fts USING fts5(
+        name, address, contact_person,
+        content='clinic', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS clinic_fts_ai AFTER INSERT ON clinic BEGIN
+        INSERT INTO clinic_fts(rowid, name, address, contact_person)
+        VALUES (new.id, new.name, new.address, new.contact_person);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS clinic_fts_ad AFTER DELETE ON clinic BEGIN
+        INSERT INTO clinic_fts(clinic_fts, rowid, name, address, contact_person)
+        VALUES ('delete', old.id, old.name, old.address, old.contact_person);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS clinic_fts_au AFTER UPDATE OF name, address, contact_person ON clinic BEGIN
+        INSERT INTO clinic_fts(clinic_fts, rowid, name, address, contact_person)
+        VALUES ('delete', old.id, old.name, old.address, old.contact_person);
+        INSERT INTO clinic_fts(rowid, name, address, contact_person)
+        VALUES (new.id, new.name, new.address, new.contact_person);
+    END""",
+]
+
+POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+] + [
+    f"CREATE INDEX IF NOT EXISTS ix_clinic_{field}_trgm ON clinic USING gin ({field} gin_trgm_ops)"
+    for field in SEARCH_FIELDS
+]
+
+# 每個資料庫是否已建立搜尋索引（以連線 URL 為 key）
+_index_ready = {}
+
+
+def sqlite_supports_fts():
+    """SQLite 3.34 起 FTS5 才內建 trigram tokenizer"""
+    return sqlite3.sqlite_version_info >= (3, 34, 0)
+
+
+def install(connection):
+    """建立搜尋索引與觸發器（可重複執行），並重建既有資料的索引"""
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        if not sqlite_supports_fts():
+            return False
+        for statement in SQLITE_DDL:
+            connection.exec_driver_sql(statement)
+        connection.exec_driver_sql("INSERT INTO clinic_fts(clinic_fts) VALUES ('rebuild')")
+    elif dialect == 'postgresql':
+        for statement in POSTGRES_DDL:
+            connection.exec_driver_sql(statement)
+    else:
+        return False
+
+    _index_ready[str(connection.engine.url)] = True
+    return True
+
+
+def register(Clinic):
+    """db.create_all() 建立 clinic 表後自動建立搜尋索引"""
+
+    @event.listens_for(Clinic.__table__, 'after_create')
+    def create_search_index(target, connection, **kw):
+        install(connection)
+
+    @event.listens_for(Clinic.__table__, 'before_drop')
+    def drop_search_index(target, connection, **kw):
+        if connection.dialect.name == 'sqlite':
+            connection.exec_driver_sql("DROP TABLE IF EXISTS clinic_fts")
+        _index_ready.pop(str(connection.engine.url), None)
+
+
+def index_ready(session):
+    """檢查目前資料庫是否已建立搜尋索引"""
+    engine = session.get_bind()
+    key = str(engine.url)
+    if key not in _index_ready:
+        try:
+            if engine.dialect.name == 'sqlite':
+                ready = session.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'clinic_fts'"
+                )).first() is not None
+            elif engine.dialect.name == 'postgresql':
+                ready = session.execute(text(
+                    "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"
+                )).first() is not None
+            else:
+                ready = False
+        except DBAPIError:
+            ready = False
+        _index_ready[key] = ready
+    return _index_ready[key]
+
+
+def split_terms(keyword):
+    """以空白拆解關鍵字，多個關鍵字為 AND 條件"""
+    return [t for t in keyword.split() if t]
+
+
+def like_condition(Clinic, term):
+    """LIKE 比對（無法使用索引時的退路）"""
+    return or_(*[getattr(Clinic, f).contains(term, autoescape=True) for f in SEARCH_FIELDS])
+
+
+def fts_query(terms):
+    """組成 FTS5 MATCH 語法：每個關鍵字視為片語，彼此為 AND"""
+    return ' '.join('"' + t.replace('"', '""') + '"' for t in terms)
+
+
+def apply_search(query, session, Clinic, keyword):
+    """
+    套用搜尋條件
+    回傳 (query, rank)，rank 為可用於排序的相關度運算式（越小越相關），無法排序時為 None
+    """
+    terms = split_terms(keyword)
+    if not terms:
+        return query, None
+
+    dialect = session.get_bind().dialect.name
+    ready = index_ready(session)
+    indexed = [t for t in terms if len(t) >= MIN_TRIGRAM_LENGTH]
+    short = [t for t in terms if len(t) < MIN_TRIGRAM_LENGTH]
+    rank = None
+
+    if ready and dialect == 'sqlite' and indexed:
+        matches = text(
+            "SELECT rowid AS id, bm25(clinic_fts) AS rank FROM clinic_fts WHERE clinic_fts MATCH :q"
+        ).bindparams(q=fts_query(indexed)).columns(column('id', Integer), column('rank', Float)).subquery('fts')
+        query = query.join(matches, matches.c.id == Clinic.id)
+        rank = matches.c.rank
+    elif ready and dialect == 'postgresql':
+        for term in terms:
+            query = query.filter(or_(*[getattr(Clinic, f).icontains(term, autoescape=True) for f in SEARCH_FIELDS]))
+        rank = -func.greatest(*[
+            func.similarity(func.coalesce(getattr(Clinic, f), ''), keyword) for f in SEARCH_FIELDS
+        ])
+        short = []
+    else:
+        short = terms
+
+    for term in short:
+        query = query.filter(like_condition(Clinic, term))
+
+    return query, rank
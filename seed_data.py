@@ -0,0 +1,208 @@
+"""
+大量測試資料產生器（效能測試用）
+  python3 seed_data.py 100000                 寫入 DATABASE_URL 指定的資料庫
+  python3 seed_data.py 100000 --append        資料庫已有資料時仍附加
+  python3 seed_data.py 10000 --xlsx a.xlsx    只產生匯入用的 Excel 檔
+資料依縣市人口比例分布，含真實區域名稱、多值科別與媒體項目；相同 seed 產生相同資料
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+from openpyxl import Workbook
+from sqlalchemy import insert
+from import_data import EXPECTED_HEADERS, IMPORT_FIELDS
+import geo
+import stats
+import tags
+
+# 縣市：(權重, 電話區碼, 區域)
+REGIONS = {
+    '新北市': (17, '02', ['板橋區', '三重區', '中和區', '永和區', '新莊區', '新店區', '土城區', '蘆洲區', '汐止區', '樹林區', '淡水區', '三峽區']),
+    '臺北市': (14, '02', ['中正區', '大同區', '中山區', '松山區', '大安區', '萬華區', '信義區', '士林區', '北投區', '內湖區', '南港區', '文山區']),
+    '臺中市': (12, '04', ['西屯區', '北屯區', '南屯區', '北區', '西區', '南區', '東區', '太平區', '大里區', '豐原區']),
+    '高雄市': (12, '07', ['前鎮區', '苓雅區', '三民區', '左營區', '鼓山區', '鳳山區', '楠梓區', '岡山區', '小港區']),
+    '桃園市': (9, '03', ['桃園區', '中壢區', '平鎮區', '八德區', '楊梅區', '蘆竹區', '龜山區', '龍潭區']),
+    '臺南市': (8, '06', ['東區', '北區', '中西區', '南區', '安平區', '安南區', '永康區', '新營區']),
+    '彰化縣': (5, '04', ['彰化市', '員林市', '和美鎮', '鹿港鎮', '北斗鎮']),
+    '屏東縣': (3.5, '08', ['屏東市', '潮州鎮', '東港鎮', '恆春鎮']),
+    '雲林縣': (2.8, '05', ['斗六市', '虎尾鎮', '北港鎮', '西螺鎮']),
+    '新竹縣': (2.4, '03', ['竹北市', '竹東鎮', '湖口鄉', '新豐鄉']),
+    '苗栗縣': (2.3, '037', ['苗栗市', '頭份市', '竹南鎮', '苑裡鎮']),
+    '嘉義縣': (2, '05', ['太保市', '朴子市', '民雄鄉', '水上鄉']),
+    '南投縣': (2, '049', ['南投市', '草屯鎮', '埔里鎮', '竹山鎮']),
+    '宜蘭縣': (2, '03', ['宜蘭市', '羅東鎮', '蘇澳鎮', '頭城鎮']),
+    '新竹市': (2, '03', ['東區', '北區', '香山區']),
+    '基隆市': (1.6, '02', ['仁愛區', '信義區', '中正區', '安樂區', '七堵區']),
+    '花蓮縣': (1.4, '03', ['花蓮市', '吉安鄉', '玉里鎮']),
+    '嘉義市': (1.4, '05', ['東區', '西區']),
+    '臺東縣': (1, '089', ['臺東市', '成功鎮', '關山鎮']),
+    '澎湖縣': (0.4, '06', ['馬公市', '湖西鄉']),
+    '金門縣': (0.3, '082', ['金城鎮', '金湖鎮']),
+    '連江縣': (0.05, '0836', ['南竿鄉', '北竿鄉']),
+}
+
+# 科別：(權重, 診所名稱用字)
+SPECIALTIES = {
+    '家醫科': (14, '家醫科'),
+    '內科': (14, '內科'),
+    '小兒科': (10, '小兒科'),
+    '耳鼻喉科': (8, '耳鼻喉科'),
+    '牙科': (16, '牙醫'),
+    '中醫': (10, '中醫'),
+    '皮膚科': (5, '皮膚科'),
+    '婦產科': (4, '婦產科'),
+    '眼科': (4, '眼科'),
+    '復健科': (4, '復健科'),
+    '骨科': (3, '骨科'),
+    '泌尿科': (2, '泌尿科'),
+    '精神科': (2, '身心科'),
+    '外科': (2, '外科'),
+}
+
+MEDIA_ITEMS = ['藥袋', '海報', '櫃檯', '派樣']
+
+NAME_WORDS = [
+    '仁愛', '康健', '安心', '博愛', '福安', '欣安', '康福', '長春', '永康', '佳音', '聖心', '慈恩',
+    '懷寧', '新生', '明德', '大順', '宏恩', '德恩', '和平', '家樂', '晨光', '安泰', '宏仁', '惠生',
+    '百齡', '順安', '健生', '同心', '樂活', '康寧', '信安', '光明', '永信', '華安', '美德', '立康',
+]
+
+SURNAMES = ['陳', '林', '黃', '張', '李', '王', '吳', '劉', '蔡', '楊', '許', '鄭', '謝', '郭', '洪', '曾']
+
+ROADS = ['中山路', '中正路', '民生路', '民權路', '民族路', '復興路', '建國路', '和平路', '信義路', '仁愛路',
+         '光復路', '忠孝路', '成功路', '文化路', '自由路', '大同路', '中華路', '三民路']
+
+BUSINESS_HOURS = [
+    '08:30-12:00,14:30-17:30,18:30-21:30',
+    '09:00-12:00,15:00-18:00',
+    '08:00-12:00,14:00-17:00,18:00-21:00',
+    '09:00-12:30,18:00-21:30',
+]
+
+# 每批寫入的筆數
+BATCH_SIZE = 5000
+
+# 資料建立時間分布（往前推的天數）
+HISTORY_DAYS = 3 * 365
+
+
+def generate_clinics(count, seed=42, now=None):
+    """逐筆產生診所資料（dict，欄位同 Clinic）"""
+    rng = random.Random(seed)
+    now = now or datetime.utcnow()
+    region_names = list(REGIONS)
+    region_weights = [REGIONS[r][0] for r in region_names]
+    specialty_names = list(SPECIALTIES)
+    specialty_weights = [SPECIALTIES[s][0] for s in specialty_names]
+
+    for _ in range(count):
+        region = rng.choices(region_names, weights=region_weights)[0]
+        _, area_code, districts = REGIONS[region]
+        district = rng.choice(districts)
+
+        specialties = []
+        for _ in range(rng.choices([1, 2, 3], weights=[70, 22, 8])[0]):
+            name = rng.choices(specialty_names, weights=specialty_weights)[0]
+            if name not in specialties:
+                specialties.append(name)
+
+        roll = rng.random()
+        if roll < 0.2:
+            media_items = '全部'
+        elif roll < 0.6:
+            media_items = ','.join(rng.sample(MEDIA_ITEMS, rng.randint(1, 3)))
+        else:
+            media_items = None
+
+        word = rng.choice(NAME_WORDS)
+        if rng.random() < 0.3:
+            word = rng.choice(SURNAMES) + word
+        created_at = now - timedelta(days=rng.random() * HISTORY_DAYS)
+
+        yield {
+            'region': region,
+            'district': district,
+            'name': f'{word}{SPECIALTIES[specialties[0]][1]}診所',
+            'health_mall': '是' if media_items == '全部' else '否',
+            'hundred_position': '是' if rng.random() < 0.1 else '否',
+            'media_items': media_items,
+            'specialties': ','.join(specialties),
+            'address': f'{region}{district}{rng.choice(ROADS)}{rng.randint(1, 3)}段{rng.randint(1, 999)}號',
+            'phone': f'{area_code}-{rng.randint(2000, 8999)}-{rng.randint(0, 9999):04d}',
+            'contact_person': f'{rng.choice(SURNAMES)}醫師',
+            'business_hours': rng.choice(BUSINESS_HOURS),
+            'note': None,
+            'created_at': created_at,
+            'updated_at': created_at + timedelta(days=rng.random() * (now - created_at).days),
+        }
+
+
+def write_xlsx(path, rows):
+    """寫出匯入格式的 Excel 檔（標題列同 import_data.EXPECTED_HEADERS）"""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(EXPECTED_HEADERS)
+    for row in rows:
+        ws.append([row[field] for field in IMPORT_FIELDS])
+    wb.save(path)
+
+
+def seed_database(db, Clinic, stat_table, geocode_table, count, seed=42, batch_size=BATCH_SIZE, log=print):
+    """
+    批次寫入 count 筆資料，再一次重建科別 / 媒體項目關聯表、統計表與座標
+    （逐筆經過 ORM 事件太慢，改為寫入後整批處理）
+    """
+    batch = []
+    written = 0
+    for row in generate_clinics(count, seed):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.session.execute(insert(Clinic), batch)
+            db.session.commit()
+            written += len(batch)
+            batch = []
+            if log:
+                log(f'已寫入 {written} 筆')
+    if batch:
+        db.session.execute(insert(Clinic), batch)
+        db.session.commit()
+        written += len(batch)
+
+    tags.rebuild_tags(db.session, Clinic)
+    db.session.commit()
+    with db.engine.begin() as connection:
+        stats.rebuild(connection, Clinic, stat_table)
+    geo.fill_missing(db.session, Clinic, geocode_table, geo.load_geocoder())
+    if log:
+        log(f'✓ 共寫入 {written} 筆，已重建關聯表、統計表與座標')
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='產生大量測試診所資料')
+    parser.add_argument('count', type=int, help='筆數')
+    parser.add_argument('--seed', type=int, default=42, help='亂數種子（相同種子產生相同資料）')
+    parser.add_argument('--xlsx', help='只寫出匯入用的 Excel 檔，不寫入資料庫')
+    parser.add_argument('--append', action='store_true', help='資料庫已有資料時仍附加')
+    args = parser.parse_args()
+
+    if args.xlsx:
+        write_xlsx(args.xlsx, generate_clinics(args.count, args.seed))
+        print(f'✓ 已寫出 {args.count} 筆至 {args.xlsx}')
+        return
+
+    from app import create_app
+    from models import db, Clinic, ClinicStat, GeocodeCache
+    import migrations
+
+    with create_app().app_context():
+        migrations.upgrade(db, Clinic)
+        existing = Clinic.query.count()
+        if existing and not args.append:
+            print(f'⚠️  資料庫已有 {existing} 筆資料，如要附加請加上 --append')
+            return
+        seed_database(db, Clinic, ClinicStat.__table__, GeocodeCache.__table__, args.count, args.seed)
+
+
+if __name__ == '__main__':
+    main()
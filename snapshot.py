@@ -0,0 +1,443 @@
+"""
+資料庫快照與還原（manage.py snapshot / restore）
+- 保留 id、建立 / 更新時間、科別 / 媒體項目關聯、統計表、地理編碼快取與異動記錄，不經過 Excel 欄位轉換
+- native（SQLite）：以 SQLite 線上備份 API 複製整個資料庫檔（含全文搜尋、空間索引與觸發器），
+  服務運作中也能取得一致的快照
+- portable：壓縮的 zip 檔，每個資料表一個 PostgreSQL COPY 文字格式（tab 分隔、\\N 為 NULL）的檔案，
+  可在 SQLite 與 PostgreSQL 之間搬移；PostgreSQL 直接以 COPY TO STDOUT / COPY FROM STDIN 串流讀寫
+- 還原（portable）需先以 manage.py migrate 建立相同版本的資料表；還原期間停用 clinic 表的觸發器，
+  載入後重建全文搜尋 / 空間索引並重設序號
+- 還原後遞增資料版本（快取與 ETag 失效）並寫入異動記錄的起始標記，用戶端的增量同步會回應 410 重新取得完整資料
+"""
+import io
+import json
+import os
+import re
+import sqlite3
+import zipfile
+from datetime import datetime
+from sqlalchemy import func, insert, select, update
+import changelog
+import geo
+import migrations
+import search
+
+# 快照格式版本（manifest 的 version）
+FORMAT_VERSION = 1
+
+# 不納入快照的資料表（背景工作記錄的是本機檔案位置）
+SKIPPED_TABLES = ('job',)
+
+# 每批寫入筆數（SQLite executemany）
+BATCH_SIZE = 10000
+
+# zip 壓縮等級（1 最快，快照以速度為主）
+COMPRESS_LEVEL = 1
+
+# SQLite 資料庫檔的開頭
+SQLITE_HEADER = b'SQLite format 3\x00'
+
+# COPY 文字格式的跳脫字元
+ESCAPES = {'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'}
+UNESCAPES = {'\\': '\\', 't': '\t', 'n': '\n', 'r': '\r', 'b': '\b', 'f': '\f', 'v': '\v'}
+ESCAPE_PATTERN = re.compile(r'[\\\t\n\r]')
+UNESCAPE_PATTERN = re.compile(r'\\(.)')
+NULL = '\\N'
+
+
+class SnapshotError(ValueError):
+    """快照檔格式錯誤或與目前資料庫不相容"""
+
+
+def snapshot_tables(db):
+    """納入快照的資料表（依外鍵相依順序）"""
+    return [table for table in db.metadata.sorted_tables if table.name not in SKIPPED_TABLES]
+
+
+def detect_format(path):
+    """由檔案內容判斷快照格式（native / portable）"""
+    if not os.path.isfile(path):
+        raise SnapshotError(f'找不到快照檔 {path}')
+    with open(path, 'rb') as f:
+        header = f.read(len(SQLITE_HEADER))
+    if header == SQLITE_HEADER:
+        return 'native'
+    if zipfile.is_zipfile(path):
+        return 'portable'
+    raise SnapshotError('無法辨識的快照檔（需為 SQLite 資料庫檔或 portable zip 檔）')
+
+
+def escape(match):
+    return ESCAPES[match.group()]
+
+
+def encode_row(row):
+    """一列資料轉為 COPY 文字格式（NULL 為 \\N，字串中的跳脫字元加上反斜線）"""
+    return '\t'.join(
+        NULL if value is None
+        else ESCAPE_PATTERN.sub(escape, value) if isinstance(value, str)
+        else str(value)
+        for value in row
+    ) + '\n'
+
+
+def unescape(match):
+    return UNESCAPES.get(match.group(1), match.group(1))
+
+
+def decode_line(line):
+    """COPY 文字格式的一列還原為字串清單（NULL 為 None；大多數欄位不含跳脫字元，直接沿用）"""
+    return [
+        None if field == NULL else UNESCAPE_PATTERN.sub(unescape, field) if '\\' in field else field
+        for field in line.rstrip('\n').split('\t')
+    ]
+
+
+def schema_versions(connection):
+    """目前資料庫已套用的遷移版本"""
+    return sorted(migrations.applied_versions(connection))
+
+
+# ---------- 建立快照 ----------
+
+def create(db, path, portable=False, log=print):
+    """
+    建立快照，回傳各資料表筆數 {資料表: 筆數}
+    SQLite 預設使用線上備份（native），portable=True 或 PostgreSQL 時輸出 portable zip 檔
+    """
+    engine = db.engine
+    if engine.dialect.name == 'sqlite' and not portable:
+        return create_native(engine, path, log)
+    return create_portable(db, path, log)
+
+
+def create_native(engine, path, log=None):
+    """SQLite 線上備份：一次複製所有頁面，期間其他連線仍可讀取"""
+    raw = engine.raw_connection()
+    try:
+        target = sqlite3.connect(path)
+        try:
+            raw.driver_connection.backup(target)
+        finally:
+            target.close()
+    finally:
+        raw.close()
+
+    target = sqlite3.connect(path)
+    try:
+        counts = {
+            name: target.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+            for name in ('clinic', 'clinic_change')
+        }
+    finally:
+        target.close()
+    if log:
+        log(f'✓ 已建立 SQLite 快照 {path}')
+    return counts
+
+
+def create_portable(db, path, log=None):
+    """逐表輸出 COPY 文字格式，在同一個唯讀交易中讀取（各表內容一致）"""
+    engine = db.engine
+    tables = snapshot_tables(db)
+    counts = {}
+
+    with engine.connect() as connection:
+        dialect = connection.dialect.name
+        if dialect == 'postgresql':
+            connection = connection.execution_options(isolation_level='REPEATABLE READ')
+            connection.exec_driver_sql('SET TRANSACTION READ ONLY')
+            connection.exec_driver_sql("SET LOCAL client_encoding = 'UTF8'")
+        elif dialect == 'sqlite':
+            # pysqlite 不會替 SELECT 開始交易，明確 BEGIN 讓各表讀取同一個快照
+            connection.exec_driver_sql('BEGIN')
+
+        manifest = {
+            'format': 'clinic-snapshot',
+            'version': FORMAT_VERSION,
+            'dialect': dialect,
+            'created_at': datetime.utcnow().isoformat(),
+            'schema_versions': schema_versions(connection),
+            'tables': [],
+        }
+
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED, compresslevel=COMPRESS_LEVEL) as archive:
+            for table in tables:
+                columns = [column.name for column in table.columns]
+                with archive.open(f'{table.name}.tsv', 'w', force_zip64=True) as stream:
+                    if dialect == 'postgresql':
+                        rows = copy_out(connection, table.name, columns, stream)
+                    else:
+                        rows = dump_rows(connection, table, columns, stream)
+                manifest['tables'].append({'name': table.name, 'columns': columns, 'rows': rows})
+                counts[table.name] = rows
+                if log:
+                    log(f'  {table.name}: {rows} 筆')
+            archive.writestr('manifest.json', json.dumps(manifest, ensure_ascii=False, indent=2))
+
+        connection.rollback()
+
+    if log:
+        log(f'✓ 已建立 portable 快照 {path}')
+    return counts
+
+
+def copy_out(connection, name, columns, stream):
+    """PostgreSQL：COPY TO STDOUT 直接寫入壓縮串流，回傳筆數"""
+    column_list = ', '.join(f'"{c}"' for c in columns)
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(f'COPY "{name}" ({column_list}) TO STDOUT', stream)
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+def dump_rows(connection, table, columns, stream):
+    """
+    SQLite：讀取原始欄位值寫成 COPY 文字格式，回傳筆數
+    SQLite 的日期時間本來就以 'YYYY-MM-DD HH:MM:SS.ffffff' 字串儲存，與 PostgreSQL 的輸出相同
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='\n')
+    column_list = ', '.join(f'"{c}"' for c in columns)
+    order = ', '.join(f'"{c.name}"' for c in table.primary_key.columns)
+    result = connection.exec_driver_sql(f'SELECT {column_list} FROM "{table.name}" ORDER BY {order}')
+    rows = 0
+    for row in result:
+        text.write(encode_row(row))
+        rows += 1
+    text.flush()
+    text.detach()
+    return rows
+
+
+# ---------- 還原 ----------
+
+def restore(db, Clinic, path, log=print):
+    """
+    以快照取代目前資料庫的內容，回傳各資料表筆數
+    native 快照只能還原到 SQLite；portable 快照可還原到任何已遷移的資料庫
+    """
+    kind = detect_format(path)
+    engine = db.engine
+    if kind == 'native':
+        if engine.dialect.name != 'sqlite':
+            raise SnapshotError('SQLite 快照只能還原到 SQLite，請改用 --portable 建立快照')
+        counts = restore_native(db, path)
+    else:
+        counts = restore_portable(db, Clinic, path, log)
+    engine.dispose()
+    if log:
+        log(f'✓ 已由 {path} 還原（{kind}）')
+    return counts
+
+
+def current_versions(connection, change_table, version_table):
+    """(異動記錄版本, 資料版本)"""
+    change_version = connection.execute(select(func.max(change_table.c.id))).scalar() or 0
+    data_version = connection.execute(
+        select(version_table.c.version).where(version_table.c.id == 1)
+    ).scalar() or 0
+    return change_version, data_version
+
+
+def finish_restore(connection, db, previous):
+    """
+    還原後的版本處理：資料版本與異動版本都必須大於還原前的值
+    否則還原後的版本號可能與還原前重複，快取與增量同步會誤用舊資料
+    """
+    change_table = db.metadata.tables['clinic_change']
+    version_table = db.metadata.tables['data_version']
+    restored = current_versions(connection, change_table, version_table)
+
+    changelog.mark_reset(connection, change_table, min_id=max(previous[0], restored[0]) + 1)
+
+    version = max(previous[1], restored[1]) + 1
+    now = datetime.utcnow()
+    result = connection.execute(
+        update(version_table).where(version_table.c.id == 1).values(version=version, updated_at=now)
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(version_table).values(id=1, version=version, updated_at=now))
+
+
+def restore_native(db, path):
+    """SQLite 線上備份 API 反向複製：快照檔整個取代目前資料庫"""
+    change_table = db.metadata.tables['clinic_change']
+    version_table = db.metadata.tables['data_version']
+    with db.engine.connect() as connection:
+        previous = current_versions(connection, change_table, version_table)
+
+    raw = db.engine.raw_connection()
+    try:
+        source = sqlite3.connect(path)
+        try:
+            source.backup(raw.driver_connection)
+        finally:
+            source.close()
+    finally:
+        raw.close()
+
+    with db.engine.begin() as connection:
+        finish_restore(connection, db, previous)
+        return {
+            table.name: connection.execute(select(func.count()).select_from(table)).scalar()
+            for table in (db.metadata.tables['clinic'], change_table)
+        }
+
+
+def read_manifest(archive):
+    try:
+        manifest = json.loads(archive.read('manifest.json'))
+    except KeyError:
+        raise SnapshotError('快照檔缺少 manifest.json')
+    if manifest.get('format') != 'clinic-snapshot' or manifest.get('version') != FORMAT_VERSION:
+        raise SnapshotError('不支援的快照格式版本')
+    return manifest
+
+
+def check_compatible(manifest, db, connection):
+    """快照的資料表與欄位都必須存在於目前資料庫（版本不同時需先遷移）"""
+    versions = schema_versions(connection)
+    if manifest['schema_versions'] != versions:
+        raise SnapshotError(
+            f"快照的資料庫版本（{max(manifest['schema_versions'], default=0)}）"
+            f"與目前資料庫（{max(versions, default=0)}）不同，請先以 manage.py migrate 更新兩邊的資料庫"
+        )
+    for entry in manifest['tables']:
+        table = db.metadata.tables.get(entry['name'])
+        if table is None:
+            raise SnapshotError(f"目前資料庫沒有資料表 {entry['name']}")
+        missing = set(entry['columns']) - set(table.columns.keys())
+        if missing:
+            raise SnapshotError(f"資料表 {entry['name']} 缺少欄位 {', '.join(sorted(missing))}")
+
+
+def restore_portable(db, Clinic, path, log=None):
+    """在單一交易中清空並載入所有資料表，失敗時整個還原回滾"""
+    change_table = db.metadata.tables['clinic_change']
+    version_table = db.metadata.tables['data_version']
+    counts = {}
+
+    with zipfile.ZipFile(path) as archive, db.engine.connect() as connection:
+        manifest = read_manifest(archive)
+        check_compatible(manifest, db, connection)
+        previous = current_versions(connection, change_table, version_table)
+        connection.rollback()
+
+        dialect = connection.dialect.name
+        entries = {entry['name']: entry for entry in manifest['tables']}
+        tables = [table for table in snapshot_tables(db) if table.name in entries]
+
+        if dialect == 'sqlite':
+            # 明確 BEGIN，刪除觸發器（DDL）也在同一個交易中，失敗時一併回滾
+            connection.exec_driver_sql('BEGIN')
+        try:
+            clear_tables(connection, tables)
+            for table in tables:
+                entry = entries[table.name]
+                with archive.open(f'{table.name}.tsv') as stream:
+                    if dialect == 'postgresql':
+                        rows = copy_in(connection, table.name, entry['columns'], stream)
+                    else:
+                        rows = load_rows(connection, table.name, entry['columns'], stream)
+                if rows != entry['rows']:
+                    raise SnapshotError(f"資料表 {table.name} 筆數不符（{rows} / {entry['rows']}），快照檔可能不完整")
+                counts[table.name] = rows
+                if log:
+                    log(f'  {table.name}: {rows} 筆')
+
+            rebuild_indexes(connection, Clinic, change_table)
+            finish_restore(connection, db, previous)
+            if dialect == 'postgresql':
+                reset_sequences(connection, tables)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+
+    return counts
+
+
+def clear_tables(connection, tables):
+    """
+    清空要還原的資料表，並暫停 clinic 表的觸發器（異動記錄、全文搜尋、空間索引）
+    載入的是快照中的異動記錄，不應再為每筆資料產生新的記錄
+    """
+    names = [table.name for table in tables]
+    if connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql("SET LOCAL client_encoding = 'UTF8'")
+        connection.exec_driver_sql('ALTER TABLE clinic DISABLE TRIGGER USER')
+        connection.exec_driver_sql('TRUNCATE ' + ', '.join(f'"{name}"' for name in names))
+        return
+
+    if connection.dialect.name == 'sqlite':
+        # R*Tree 逐筆刪除很慢，直接刪除整個空間索引表，載入後由 geo.install 重建
+        connection.exec_driver_sql('DROP TABLE IF EXISTS clinic_geo')
+        triggers = connection.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'clinic'"
+        ).scalars().all()
+        for trigger in triggers:
+            connection.exec_driver_sql(f'DROP TRIGGER "{trigger}"')
+    for name in reversed(names):
+        connection.exec_driver_sql(f'DELETE FROM "{name}"')
+
+
+def rebuild_indexes(connection, Clinic, change_table):
+    """恢復 clinic 表的觸發器，並由載入的資料重建全文搜尋 / 空間索引"""
+    if connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql('ALTER TABLE clinic ENABLE TRIGGER USER')
+        return
+    changelog.install(connection, Clinic, change_table)
+    search.install(connection)
+    geo.install(connection)
+
+
+def copy_in(connection, name, columns, stream):
+    """PostgreSQL：壓縮串流直接交給 COPY FROM STDIN，回傳筆數"""
+    column_list = ', '.join(f'"{c}"' for c in columns)
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(f'COPY "{name}" ({column_list}) FROM STDIN', stream)
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+def load_rows(connection, name, columns, stream):
+    """
+    SQLite：解析 COPY 文字格式，以 executemany 分批寫入，回傳筆數
+    欄位值皆為字串，由 SQLite 的欄位型別親和性轉為整數 / 浮點數（日期時間維持字串，與 ORM 寫入的格式相同）
+    """
+    column_list = ', '.join(f'"{c}"' for c in columns)
+    placeholders = ', '.join('?' for _ in columns)
+    statement = f'INSERT INTO "{name}" ({column_list}) VALUES ({placeholders})'
+    cursor = connection.connection.cursor()
+    rows = 0
+    batch = []
+    try:
+        for line in io.TextIOWrapper(stream, encoding='utf-8', newline='\n'):
+            batch.append(decode_line(line))
+            if len(batch) >= BATCH_SIZE:
+                cursor.executemany(statement, batch)
+                rows += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(statement, batch)
+            rows += len(batch)
+    finally:
+        cursor.close()
+    return rows
+
+
+def reset_sequences(connection, tables):
+    """PostgreSQL：載入指定 id 的資料後，序號需從最大 id 之後繼續"""
+    for table in tables:
+        if 'id' not in table.columns or not table.columns['id'].autoincrement:
+            continue
+        sequence = connection.exec_driver_sql(f"SELECT pg_get_serial_sequence('\"{table.name}\"', 'id')").scalar()
+        if sequence:
+            connection.exec_driver_sql(
+                f'SELECT setval(%(sequence)s, COALESCE(MAX(id), 0) + 1, false) FROM "{table.name}"',
+                {'sequence': sequence},
+            )
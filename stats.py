@@ -0,0 +1,177 @@
+"""
+預先計算的統計表 clinic_stat：(kind, key) -> value（診所數）
+儀表板直接讀取此表（筆數只與縣市 / 科別 / 媒體項目的種類數有關），不再掃描 clinic 表
+
+kind：
+- total / media / health_mall / hundred_position（key 為空字串）
+- region、region_health_mall：各縣市診所數與健康醫購數
+- specialty、specialty_health_mall：各科別診所數與健康醫購數
+- media_item：各媒體項目診所數
+
+更新方式：
+- ORM 新增、修改、刪除：flush 前後各讀取一次受影響診所的資料庫內容，套用差值
+- 匯入等直接執行的批次寫入：呼叫 snapshot() / apply_changes()
+- 資料不一致時以 python3 manage.py rebuild-stats 重建
+"""
+from collections import Counter
+from sqlalchemy import delete, event, inspect, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from analytics import HEALTH_MALL_MEDIA
+from tags import split_tags
+
+# 影響統計的欄位
+STAT_FIELDS = ('region', 'specialties', 'media_items', 'hundred_position')
+
+# 支援 ON CONFLICT 的資料庫
+DIALECT_INSERTS = {
+    'sqlite': sqlite_insert,
+    'postgresql': postgresql_insert,
+}
+
+# 重建時每批讀取的筆數
+BATCH_SIZE = 1000
+
+
+def contributions(region, specialties, media_items, hundred_position):
+    """單一診所對各統計項目的貢獻"""
+    counts = Counter()
+    health_mall = HEALTH_MALL_MEDIA in (media_items or '')
+
+    counts[('total', '')] += 1
+    if media_items:
+        counts[('media', '')] += 1
+    if health_mall:
+        counts[('health_mall', '')] += 1
+    if hundred_position == '是':
+        counts[('hundred_position', '')] += 1
+
+    if region:
+        counts[('region', region)] += 1
+        if health_mall:
+            counts[('region_health_mall', region)] += 1
+
+    for name in split_tags(specialties):
+        counts[('specialty', name)] += 1
+        if health_mall:
+            counts[('specialty_health_mall', name)] += 1
+
+    for name in split_tags(media_items):
+        counts[('media_item', name)] += 1
+
+    return counts
+
+
+def count_rows(rows):
+    """加總多筆診所 (region, specialties, media_items, hundred_position) 的貢獻"""
+    counts = Counter()
+    for row in rows:
+        counts.update(contributions(*row))
+    return counts
+
+
+def snapshot(connection, Clinic, clinic_ids):
+    """讀取指定診所目前在資料庫中的統計貢獻"""
+    clinic_ids = list(clinic_ids)
+    counts = Counter()
+    for start in range(0, len(clinic_ids), BATCH_SIZE):
+        chunk = clinic_ids[start:start + BATCH_SIZE]
+        counts.update(count_rows(connection.execute(
+            select(*[getattr(Clinic, f) for f in STAT_FIELDS]).where(Clinic.id.in_(chunk))
+        )))
+    return counts
+
+
+def apply_delta(connection, stat_table, delta):
+    """將差值累加到統計表（不存在的項目會新增）"""
+    values = [
+        {'kind': kind, 'key': key, 'value': count}
+        for (kind, key), count in sorted(delta.items()) if count
+    ]
+    if not values:
+        return
+
+    dialect_insert = DIALECT_INSERTS.get(connection.dialect.name)
+    if dialect_insert:
+        stmt = dialect_insert(stat_table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[stat_table.c.kind, stat_table.c.key],
+            set_={'value': stat_table.c.value + stmt.excluded.value}
+        )
+        connection.execute(stmt, values)
+        return
+
+    for value in values:
+        result = connection.execute(
+            update(stat_table).where(
+                stat_table.c.kind == value['kind'], stat_table.c.key == value['key']
+            ).values(value=stat_table.c.value + value['value'])
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(stat_table), value)
+
+
+def apply_changes(connection, Clinic, stat_table, before, clinic_ids):
+    """以寫入前的 snapshot 與寫入後的資料庫內容計算差值並套用"""
+    delta = snapshot(connection, Clinic, clinic_ids)
+    delta.subtract(before)
+    apply_delta(connection, stat_table, delta)
+
+
+def register(session, Clinic, stat_table):
+    """ORM 寫入時增量更新統計表"""
+
+    def stat_changed(obj):
+        state = inspect(obj)
+        return any(getattr(state.attrs, f).history.has_changes() for f in STAT_FIELDS)
+
+    @event.listens_for(session, 'before_flush')
+    def stats_before_flush(sess, flush_context, instances):
+        changed = [
+            obj.id for obj in sess.dirty
+            if isinstance(obj, Clinic) and obj.id is not None and stat_changed(obj)
+        ]
+        deleted = [obj.id for obj in sess.deleted if isinstance(obj, Clinic) and obj.id is not None]
+        if not changed and not deleted:
+            return
+        with sess.no_autoflush:
+            sess.info['stats_before'] = snapshot(sess.connection(), Clinic, changed + deleted)
+        sess.info['stats_ids'] = changed + deleted
+
+    @event.listens_for(session, 'after_flush')
+    def stats_after_flush(sess, flush_context):
+        before = sess.info.pop('stats_before', Counter())
+        clinic_ids = sess.info.pop('stats_ids', [])
+        clinic_ids += [obj.id for obj in sess.new if isinstance(obj, Clinic)]
+        if clinic_ids:
+            apply_changes(sess.connection(), Clinic, stat_table, before, clinic_ids)
+
+
+def rebuild(connection, Clinic, stat_table, batch_size=BATCH_SIZE):
+    """由 clinic 表重新計算整張統計表，回傳 (新增或修正的項目數, 移除的項目數)"""
+    counts = Counter()
+    last_id = 0
+    columns = [getattr(Clinic, f) for f in STAT_FIELDS]
+    while True:
+        rows = connection.execute(
+            select(Clinic.id, *columns).where(Clinic.id > last_id).order_by(Clinic.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        counts.update(count_rows(row[1:] for row in rows))
+
+    existing = {
+        (kind, key): count
+        for kind, key, count in connection.execute(select(stat_table.c.kind, stat_table.c.key, stat_table.c.value))
+    }
+    fixed = sum(1 for item, count in counts.items() if existing.get(item) != count)
+    removed = sum(1 for item, count in existing.items() if count and item not in counts)
+
+    connection.execute(delete(stat_table))
+    if counts:
+        connection.execute(insert(stat_table), [
+            {'kind': kind, 'key': key, 'value': count} for (kind, key), count in sorted(counts.items())
+        ])
+
+    return fixed, removed
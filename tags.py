@@ -0,0 +1,125 @@
+"""
+科別 / 媒體項目正規化
+Clinic.specialties、Clinic.media_items 保留為逗號分隔的反正規化欄位給前端使用，
+實際篩選與統計改走 specialty / media_item 對照表與有索引的關聯表
+"""
+from sqlalchemy import delete, event, inspect, insert, select
+
+# 反正規化欄位 -> 關聯屬性名稱
+TAG_FIELDS = {
+    'specialties': 'specialty_tags',
+    'media_items': 'media_tags',
+}
+
+
+def split_tags(value):
+    """拆解逗號分隔的複選欄位（去除空白與重複，保留順序）"""
+    if not value:
+        return []
+    names = []
+    for name in value.split(','):
+        name = name.strip()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def link_columns(Clinic, field):
+    """取得欄位對應的 (對照表 Model, 關聯表, 關聯表 clinic_id 欄, 關聯表 tag_id 欄)"""
+    relation = getattr(Clinic, TAG_FIELDS[field]).property
+    model = relation.mapper.class_
+    link = relation.secondary
+    clinic_column = next(c for c in link.c if c.references(Clinic.__table__.c.id))
+    tag_column = next(c for c in link.c if c.references(model.__table__.c.id))
+    return model, link, clinic_column, tag_column
+
+
+def tag_filter(Clinic, field, name):
+    """
+    篩選條件：診所含有指定的科別 / 媒體項目（完全比對）
+    以 IN 子查詢走 (tag_id, clinic_id) 索引，不再對字串欄位做 LIKE '%x%'
+    """
+    model, link, clinic_column, tag_column = link_columns(Clinic, field)
+    return Clinic.id.in_(
+        select(clinic_column).join(model, tag_column == model.id).where(model.name == name)
+    )
+
+
+def get_or_create_tags(session, model, names, cache):
+    """依名稱取得對照表資料，不存在的自動建立"""
+    missing = [n for n in names if n not in cache]
+    if missing:
+        with session.no_autoflush:
+            for tag in session.query(model).filter(model.name.in_(missing)):
+                cache[tag.name] = tag
+        for name in missing:
+            if name not in cache:
+                tag = model(name=name)
+                session.add(tag)
+                cache[name] = tag
+    return [cache[n] for n in names]
+
+
+def register(session, Clinic):
+    """在 flush 前同步關聯表，涵蓋新增、更新與匯入等所有 ORM 寫入"""
+
+    @event.listens_for(session, 'before_flush')
+    def sync_tags(session, flush_context, instances):
+        caches = {field: {} for field in TAG_FIELDS}
+        for obj in list(session.new) + list(session.dirty):
+            if not isinstance(obj, Clinic):
+                continue
+            state = inspect(obj)
+            for field, relation in TAG_FIELDS.items():
+                if state.pending or getattr(state.attrs, field).history.has_changes():
+                    names = split_tags(getattr(obj, field))
+                    model = link_columns(Clinic, field)[0]
+                    setattr(obj, relation, get_or_create_tags(session, model, names, caches[field]))
+
+    return sync_tags
+
+
+def rebuild_tags(session, Clinic, clinic_ids=None, batch_size=1000, fields=TAG_FIELDS):
+    """
+    由逗號字串欄位重建關聯表（資料遷移、批次匯入或批次修改後使用）
+    clinic_ids 為 None 時依 id 分批重建全部；fields 可只重建部分欄位
+    """
+    if clinic_ids is not None:
+        clinic_ids = list(clinic_ids)
+
+    for field in fields:
+        model, link, clinic_column, tag_column = link_columns(Clinic, field)
+        column = getattr(Clinic, field)
+        tag_ids = dict(session.execute(select(model.name, model.id)).all())
+
+        last_id = 0
+        offset = 0
+        while True:
+            query = select(Clinic.id, column).order_by(Clinic.id)
+            if clinic_ids is None:
+                rows = session.execute(query.where(Clinic.id > last_id).limit(batch_size)).all()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+            else:
+                chunk = clinic_ids[offset:offset + batch_size]
+                if not chunk:
+                    break
+                offset += batch_size
+                rows = session.execute(query.where(Clinic.id.in_(chunk))).all()
+
+            new_names = {n for _, value in rows for n in split_tags(value)} - tag_ids.keys()
+            if new_names:
+                session.execute(insert(model), [{'name': n} for n in sorted(new_names)])
+                tag_ids.update(session.execute(
+                    select(model.name, model.id).where(model.name.in_(new_names))
+                ).all())
+
+            session.execute(delete(link).where(clinic_column.in_([r[0] for r in rows])))
+            links = [
+                {clinic_column.key: clinic_id, tag_column.key: tag_ids[name]}
+                for clinic_id, value in rows
+                for name in split_tags(value)
+            ]
+            if links:
+                session.execute(insert(link), links)